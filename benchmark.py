@@ -0,0 +1,162 @@
+'''
+Benchmarks search space exploration of heur4ct.py, stripcd.py, rectpacker.py and blockpacker.py on fixed samples of configurations
+and checks the resulting numbers of LITTLE cores against the reference results in results_*.
+'''
+
+
+import sys
+import os
+import time
+import random
+import multiprocessing
+import numpy as np
+import heur4ct
+import stripcd
+import rectpacker
+import blockpacker
+from instrumentation import get_peak_memory
+from sweeputils import pop_option, sweep_cells
+from boundindex import BoundIndex
+
+
+BENCHMARK_SEED = 4711
+DEFAULT_SAMPLE_SIZE = 100
+DEFAULT_CHIPS = "16x16,24x24,32x32"
+REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results_{}x{}")
+# Engine, algorithm variant (placement order or packing algorithm), reference results file
+BENCHMARKS = [
+    ("heur4ct", "random", "solutions_heuristic_random.csv"),
+    ("heur4ct", "totalarea", "solutions_heuristic_totalarea.csv"),
+    ("heur4ct", "corearea", "solutions_heuristic_corearea.csv"),
+    ("stripcd", "", "solutions_strippacking.csv"),
+    ("rectpacker", "maxrectsrot", "solutions_rectpack_maxrects_rot.csv"),
+    ("rectpacker", "maxrectsnorot", "solutions_rectpack_maxrects_norot.csv"),
+    ("rectpacker", "guillotinerot", "solutions_rectpack_guillotine_rot.csv"),
+    ("rectpacker", "guillotinenorot", "solutions_rectpack_guillotine_norot.csv"),
+    ("rectpacker", "skylinerot", "solutions_rectpack_skyline_rot.csv"),
+    ("rectpacker", "skylinenorot", "solutions_rectpack_skyline_norot.csv"),
+    ("blockpacker", "", "solutions_blockpacking.csv")
+]
+ENGINES = {
+    "heur4ct": heur4ct,
+    "stripcd": stripcd,
+    "rectpacker": rectpacker,
+    "blockpacker": blockpacker
+}
+
+
+# Sets chip size and algorithm variant of given engine, as done by its main function
+def setup_engine(engine, variant, chipwidth, chipheight):
+    module = ENGINES[engine]
+    module.CHIPWIDTH = chipwidth
+    module.CHIPHEIGHT = chipheight
+    module.set_coreinfo()
+    if engine == "rectpacker":
+        module.set_packing_algorithm(variant)
+    elif engine == "heur4ct":
+        # Random placement orders are drawn from the same stream as in a sweep
+        random.seed(module.RANDOM_SEED)
+    return module
+
+
+def read_reference(reference_file):
+    reference = {}
+    if not os.path.isfile(reference_file):
+        return None
+    with open(reference_file, "r") as reff:
+        for line in reff:
+            i, j, k, numct3 = [int(field) for field in line.split(",")]
+            reference[(i, j, k)] = numct3
+    return reference
+
+
+# Explores a sample of sample_size configurations of the search space in sweep order and times exploration
+# Configurations not in the sample are passed over, except for drawing their random placement order (heur4ct)
+# Exploration stops once time_limit seconds (if given) have elapsed, as single configurations may take minutes on large chips
+# Runs in a process of its own, so that caches are cold and the peak memory usage is that of the benchmark
+def run_benchmark(engine, variant, chipwidth, chipheight, sample_size, reference_file, time_limit):
+    module = setup_engine(engine, variant, chipwidth, chipheight)
+    maxcts = [module.COREINFO[ct].maxrows * module.COREINFO[ct].maxcols for ct in module.CORE_ORDER[:-1]]
+    # Sample is drawn from configurations satisfying the chip area constraint, as the others are not explored by sweeps
+    # (flat indexes of the bound index enumerate cells in sweep order)
+    bounds = BoundIndex(chipwidth, chipheight, module.COREINFO, module.CORE_ORDER)
+    candidates = np.flatnonzero(bounds.feasible).tolist()
+    sample = set(random.Random(BENCHMARK_SEED).sample(candidates, min(sample_size, len(candidates))))
+    del candidates
+    results = {}
+    start_time = time.perf_counter()
+    for index, cell in enumerate(sweep_cells(*maxcts)):
+        if time_limit is not None and time.perf_counter() - start_time > time_limit:
+            break
+        if index not in sample:
+            if engine == "heur4ct":
+                module.get_placement_order(variant, *cell)
+            continue
+        if engine == "heur4ct":
+            results[cell], _ = module.explore_cell(*cell, variant)
+        else:
+            results[cell], _ = module.explore_cell(*cell)
+    duration = time.perf_counter() - start_time
+    reference = read_reference(reference_file)
+    mismatches = None
+    if reference is not None:
+        mismatches = [cell for cell, numct3 in results.items() if reference.get(cell) != numct3]
+    return {
+        "cells": len(results),
+        "seconds": duration,
+        "cells_per_second": len(results) / duration if duration > 0 else float("inf"),
+        "peak_memory_kb": get_peak_memory(),
+        "mismatches": mismatches
+    }
+
+
+# Options (all optional):
+# --sample N: number of configurations explored per benchmark (default DEFAULT_SAMPLE_SIZE)
+# --chips LIST: comma-separated chip sizes, e.g. 16x16,24x24 (default DEFAULT_CHIPS), reference results are only available
+#   for chip sizes with a results directory
+# --engines LIST: comma-separated engines to benchmark, e.g. heur4ct,stripcd (default: all)
+# --time-limit SECONDS: stops exploring the sample of a benchmark after given time (recommended for chips larger than 32x32)
+# --output FILE: appends results as CSV lines (engine,variant,chip,cells,seconds,cells/s,peak memory in kB,mismatches)
+# Mismatches with reference results are printed; exit status is 1 if there are any
+def main():
+    sample_size = int(pop_option(sys.argv, "--sample", DEFAULT_SAMPLE_SIZE))
+    chips = pop_option(sys.argv, "--chips", DEFAULT_CHIPS).split(",")
+    engines = pop_option(sys.argv, "--engines", ",".join(ENGINES.keys())).split(",")
+    output_file = pop_option(sys.argv, "--output")
+    time_limit = pop_option(sys.argv, "--time-limit")
+    if time_limit is not None:
+        time_limit = float(time_limit)
+    for engine in engines:
+        if engine not in ENGINES:
+            print("Engine {} unknown! Exiting...".format(engine))
+            sys.exit(1)
+    regression = False
+    for chip in chips:
+        width, height = [int(size) for size in chip.split("x")]
+        for engine, variant, reference_name in BENCHMARKS:
+            if engine not in engines:
+                continue
+            reference_file = os.path.join(REFERENCE_PATH.format(width, height), reference_name)
+            # Fresh process per benchmark
+            with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+                result = pool.apply(run_benchmark, (engine, variant, width * 100, height * 100, sample_size, reference_file, time_limit))
+            if result["mismatches"] is None:
+                check = "no reference"
+            elif result["mismatches"]:
+                check = "{} mismatches".format(len(result["mismatches"]))
+                regression = True
+            else:
+                check = "ok"
+            print("{:<11} {:<15} {:>5} {:>6} cells {:>9.3f} s {:>10.1f} cells/s {:>8} kB  {}".format(engine, variant, chip, result["cells"], result["seconds"], result["cells_per_second"], result["peak_memory_kb"], check))
+            if result["mismatches"]:
+                print("  Mismatching configurations:", " ".join("({},{},{})".format(*cell) for cell in sorted(result["mismatches"])))
+            if output_file is not None:
+                with open(output_file, "a") as outf:
+                    num_mismatches = len(result["mismatches"]) if result["mismatches"] is not None else ""
+                    outf.write("{},{},{},{},{},{},{},{}\n".format(engine, variant, chip, result["cells"], result["seconds"], result["cells_per_second"], result["peak_memory_kb"], num_mismatches))
+    if regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
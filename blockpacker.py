@@ -0,0 +1,279 @@
+'''
+Computes max. configurations for chip design by packing cores of the same type as rows and blocks on a skyline.
+'''
+
+
+import time
+import sys
+from layoutstore import LayoutWriter
+from resultsink import ResultSink, get_checkpoint_file
+from nonproximity import NonproximityWriter
+from instrumentation import Instrumentation, timed_phase
+from sweeputils import pop_option, pop_flag, SweepPruner, sweep_cells, load_checkpoint
+from boundindex import BoundIndex
+
+
+CHIPWIDTH = None # 2400 # 3200
+CHIPHEIGHT = None # 2400 # 3200
+CORE_ORDER = ["big", "A72", "Mali", "LITTLE"]
+# Layouts explored are saved to a layout store (cf. layoutstore.py)
+LAYOUT_STORE = "/tmp/layouts_blockpacking"
+INSTRUMENTATION = None
+
+
+class Core:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.maxrows = int(CHIPHEIGHT // height)
+        self.maxcols = int(CHIPWIDTH // width)
+
+
+COREINFO = None
+
+def set_coreinfo():
+    global COREINFO
+    COREINFO = {
+        "big": Core(500,380),
+        "LITTLE": Core(210,181),
+        "A72": Core(583,469),
+        "Mali": Core(449,394)
+    }
+
+
+# Horizontal segment of the skyline, i.e. of the upper contour of the cores placed so far
+class Segment:
+    __slots__ = ("x", "y", "width")
+
+    def __init__(self, x, y, width):
+        self.x = x
+        self.y = y
+        self.width = width
+
+
+# Layout of a chip, in the format of the other solvers (coresx, coresy, coresw, coresh, corest)
+class Layout:
+    def __init__(self):
+        self.coresx = []
+        self.coresy = []
+        self.coresw = []
+        self.coresh = []
+        self.corest = []
+
+    def add_block(self, x, y, w, h, coretype, rows, cols):
+        for row in range(rows):
+            for col in range(cols):
+                self.coresx.append(x + col * w)
+                self.coresy.append(y + row * h)
+                self.coresw.append(w)
+                self.coresh.append(h)
+                self.corest.append(coretype)
+
+    def as_tuple(self):
+        return self.coresx, self.coresy, self.coresw, self.coresh, self.corest
+
+
+# Returns index of the lowest segment of skyline (the leftmost one among equally low segments)
+def lowest_segment(skyline):
+    return min(range(len(skyline)), key=lambda s: skyline[s].y)
+
+
+def merge_segments(skyline):
+    merged = [skyline[0]]
+    for segment in skyline[1:]:
+        if segment.y == merged[-1].y:
+            merged[-1].width += segment.width
+        else:
+            merged.append(segment)
+    skyline[:] = merged
+
+
+# Raises segment s to the height of its lower neighbour, giving up the area below (done if no core fits onto segment s)
+def raise_segment(skyline, s):
+    skyline[s].y = min(skyline[n].y for n in (s-1, s+1) if 0 <= n < len(skyline))
+    merge_segments(skyline)
+
+
+# Returns orientation (w, h) of core type in which most of the width of segment is covered by a row of at most count cores,
+# or None if the core type fits onto segment in neither orientation
+def choose_orientation(segment, coretype, count):
+    core = COREINFO[coretype]
+    best = None
+    for w, h in [(core.width, core.height), (core.height, core.width)]:
+        if w > segment.width or segment.y + h > CHIPHEIGHT:
+            continue
+        covered = min(segment.width // w, count) * w
+        if best is None or covered > best[0] or covered == best[0] and h < best[2]:
+            best = (covered, w, h)
+    if best is None:
+        return None
+    return best[1], best[2]
+
+
+# Places a block of cores of given type and orientation onto segment s
+# The block consists of as many full rows as fit below the chip's upper edge and the next lowest segment (at least one),
+# or of a single row of count cores if count does not fill a row
+# Returns number of cores placed
+def place_block(skyline, s, coretype, count, w, h, layout):
+    segment = skyline[s]
+    percol = segment.width // w
+    limit = min([other.y for other in skyline if other is not segment] + [CHIPHEIGHT])
+    rows = min(max(1, (limit - segment.y) // h), (CHIPHEIGHT - segment.y) // h, count // percol)
+    if rows == 0:
+        rows, cols = 1, count
+    else:
+        cols = percol
+    layout.add_block(segment.x, segment.y, w, h, coretype, rows, cols)
+    if cols * w == segment.width:
+        segment.y += rows * h
+    else:
+        skyline.insert(s, Segment(segment.x, segment.y + rows * h, cols * w))
+        segment.x += cols * w
+        segment.width -= cols * w
+    merge_segments(skyline)
+    return rows * cols
+
+
+# Places up to count cores of given type, block by block onto the lowest segment of skyline
+# Returns number of cores placed, which is less than count if no further core fits onto the chip
+def pack_cores(skyline, coretype, count, layout):
+    placed = 0
+    while placed < count:
+        s = lowest_segment(skyline)
+        orientation = choose_orientation(skyline[s], coretype, count - placed)
+        if orientation is not None:
+            placed += place_block(skyline, s, coretype, count - placed, *orientation, layout)
+        elif skyline[s].y + min(COREINFO[coretype].width, COREINFO[coretype].height) > CHIPHEIGHT or len(skyline) == 1:
+            # Core does not fit below chip's upper edge (no segment is lower), or is wider than the chip
+            break
+        else:
+            raise_segment(skyline, s)
+    return placed
+
+
+# Packs given (core type, count) pairs in order, followed by as many cores of type fillwith as fit
+# Returns number of cores of type fillwith and layout, or -1 and None if not all cores of the pairs could be placed
+def pack_chip(corecounts, fillwith):
+    skyline = [Segment(0, 0, CHIPWIDTH)]
+    layout = Layout()
+    free_area = CHIPWIDTH * CHIPHEIGHT
+    for coretype, count in corecounts:
+        if pack_cores(skyline, coretype, count, layout) < count:
+            return -1, None
+        free_area -= count * COREINFO[coretype].width * COREINFO[coretype].height
+    numfill = pack_cores(skyline, fillwith, free_area // (COREINFO[fillwith].width * COREINFO[fillwith].height), layout)
+    return numfill, layout.as_tuple()
+
+
+# Packs cores for core counts (i,j,k) of the first three core types in CORE_ORDER, followed by as many cores of the fourth as fit
+# Returns number of cores of the fourth type and layout (coresx, coresy, coresw, coresh, corest), or -1 and None if infeasible
+def explore_cell(i, j, k):
+    with timed_phase(INSTRUMENTATION, "packing"):
+        return pack_chip(list(zip(CORE_ORDER[:-1], [i, j, k])), CORE_ORDER[-1])
+
+
+def read_input(input_file):
+    corecounts = []
+    with open(input_file, 'r') as inpf:
+        inputlines = inpf.readlines()
+    fillwith = inputlines[0].rstrip("\n")
+    for i in range(1, len(inputlines)):
+        coretype, corecount = inputlines[i].split(",")
+        corecounts.append((coretype, int(corecount)))
+    return corecounts, fillwith
+
+
+# Arguments to be passed: output file (including path), chip width and height (in mm), input file (optional)
+# Format for input file (as for rectpacker.py):
+# - core type to fill chip with
+# - core type,#cores of core type [in order of placement]
+# If an input file is passed, the layout is written to the output file as lines x,y,w,h,core type
+# Otherwise, the search space is systematically explored and results are written to the output file
+# Configurations violating the chip area constraint (cf. boundindex.py) are skipped (i.e., reported as infeasible) without packing
+# Option --prune-dominated also skips configurations with a component-wise smaller infeasible configuration
+# (packing is not monotone in the core counts, so results may differ)
+# Option --resume continues an interrupted exploration, skipping all configurations already listed in the output file (or its partial file)
+# Option --instrument FILE appends time spent per phase, wall time and peak memory for the run and each explored
+# configuration to FILE as JSON lines
+# Option --layouts PATH saves layouts to the layout store at PATH instead of LAYOUT_STORE
+# Option --nonproximity FILE also computes nonproximity per core type of each layout right after exploring its
+# configuration, and writes it to FILE (cf. NonproximityWriter in nonproximity.py)
+# Results of explorations are written to a partial file (cf. resultsink.py), replacing the results file once complete
+def main():
+    prune_dominated = pop_flag(sys.argv, "--prune-dominated")
+    resume = pop_flag(sys.argv, "--resume")
+    instrument_file = pop_option(sys.argv, "--instrument")
+    layouts_path = pop_option(sys.argv, "--layouts")
+    nonproximity_file = pop_option(sys.argv, "--nonproximity")
+    if len(sys.argv) < 4:
+        print("Please specify output file and chip size!")
+        sys.exit(1)
+    output_file = sys.argv[1]
+    global CHIPWIDTH
+    CHIPWIDTH = int(sys.argv[2]) * 100
+    global CHIPHEIGHT
+    CHIPHEIGHT = int(sys.argv[3]) * 100
+    set_coreinfo()
+    global INSTRUMENTATION
+    if instrument_file is not None:
+        INSTRUMENTATION = Instrumentation(instrument_file, {"engine": "blockpacker", "variant": "", "chip": "{}x{}".format(sys.argv[2], sys.argv[3])})
+    if len(sys.argv) >= 5:
+        corecounts, fillwith = read_input(sys.argv[4])
+        numfill, layout = pack_chip(corecounts, fillwith)
+        if layout is None:
+            print("Cores do not fit onto chip!")
+            sys.exit(1)
+        print("{} cores of type {} placed".format(numfill, fillwith))
+        # Print chip design to file, to be processed by plotter
+        with open(output_file, 'w') as cff:
+            for x, y, w, h, coretype in zip(*layout):
+                cff.write("{},{},{},{},{}\n".format(x, y, w, h, coretype))
+    else:
+        # Explore search space
+        maxct0 = COREINFO[CORE_ORDER[0]].maxrows * COREINFO[CORE_ORDER[0]].maxcols
+        maxct1 = COREINFO[CORE_ORDER[1]].maxrows * COREINFO[CORE_ORDER[1]].maxcols
+        maxct2 = COREINFO[CORE_ORDER[2]].maxrows * COREINFO[CORE_ORDER[2]].maxcols
+        bounds = BoundIndex(CHIPWIDTH, CHIPHEIGHT, COREINFO, CORE_ORDER)
+
+        layout_store = layouts_path if layouts_path is not None else LAYOUT_STORE
+        completed = {}
+        if resume:
+            completed = load_checkpoint(get_checkpoint_file(output_file), sweep_cells(maxct0, maxct1, maxct2), layout_store, CORE_ORDER[-1])
+        with LayoutWriter(layout_store, resume) as layouts, ResultSink(output_file, resume) as sink, NonproximityWriter(nonproximity_file) as metrics:
+            metrics.write_completed(completed, layout_store)
+            pruner = SweepPruner(bounds, prune_dominated)
+            for i, j, k in sweep_cells(maxct0, maxct1, maxct2):
+                if (i, j, k) in completed:
+                    pruner.record(i, j, k, completed[(i, j, k)])
+                    continue
+                if INSTRUMENTATION is not None:
+                    INSTRUMENTATION.begin_cell()
+                if pruner.skip(i, j, k):
+                    pruner.record(i, j, k, -1)
+                    with timed_phase(INSTRUMENTATION, "file I/O"):
+                        sink.write_result(i, j, k, -1)
+                        metrics.write(i, j, k, -1)
+                    if INSTRUMENTATION is not None:
+                        INSTRUMENTATION.end_cell(i, j, k, -1, skipped=True)
+                    continue
+                numct3, layout = explore_cell(i, j, k)
+                pruner.record(i, j, k, numct3)
+                with timed_phase(INSTRUMENTATION, "file I/O"):
+                    if layout is not None:
+                        layouts.write_layout(i, j, k, *layout)
+                    sink.write_result(i, j, k, numct3)
+                with timed_phase(INSTRUMENTATION, "nonproximity"):
+                    metrics.write(i, j, k, numct3, layout)
+                if INSTRUMENTATION is not None:
+                    INSTRUMENTATION.end_cell(i, j, k, numct3, skipped=False)
+        print("Cells skipped:", pruner.cells_skipped)
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.finish()
+
+
+if __name__ == "__main__":
+    start_time = time.process_time()
+    main()
+    end_time = time.process_time()
+    with open("./timeblockpack.log", 'a+') as tlog:
+        tlog.write(str(end_time - start_time) + "," + sys.argv[2] + "x" + sys.argv[3] + "\n")
@@ -0,0 +1,74 @@
+'''
+Index of the chip area constraint over the search space: for each configuration (i,j,k) of the first three core types,
+whether it satisfies the constraint and the upper bound for the number of cores of the fourth type (i.e. LITTLE cores).
+The index is computed once per chip size and core sizes and saved to a file, which is memory-mapped on later use.
+'''
+
+
+import os
+import numpy as np
+
+
+CORE_ORDER = ["big", "A72", "Mali", "LITTLE"]
+# Index files are saved as INDEX_PATH_<chip size>_<core sizes>.npy (cf. get_index_path)
+INDEX_PATH = "/tmp/boundindex"
+INDEX_SUFFIX = ".npy"
+
+
+# Returns path of index file for given chip size and core sizes, such that indexes of different chips or cores do not mix
+def get_index_path(chipwidth, chipheight, coreinfo, core_order=CORE_ORDER, path=INDEX_PATH):
+    coresizes = "_".join("{}x{}".format(coreinfo[coretype].width, coreinfo[coretype].height) for coretype in core_order)
+    return "{}_{}x{}_{}{}".format(path, chipwidth, chipheight, coresizes, INDEX_SUFFIX)
+
+
+# Upper bounds for number of cores of type core_order[3] by chip area left after placing i, j, k cores of types
+# core_order[0], core_order[1], core_order[2], for all cells of the search space; -1 where the chip area constraint is violated
+def compute_bounds(chipwidth, chipheight, coreinfo, core_order=CORE_ORDER):
+    free_area = np.int64(chipwidth * chipheight)
+    for axis, coretype in enumerate(core_order[:-1]):
+        shape = [1, 1, 1]
+        shape[axis] = coreinfo[coretype].maxrows * coreinfo[coretype].maxcols + 1
+        counts = np.arange(shape[axis], dtype=np.int64).reshape(shape)
+        free_area = free_area - counts * (coreinfo[coretype].width * coreinfo[coretype].height)
+    fillarea = coreinfo[core_order[-1]].width * coreinfo[core_order[-1]].height
+    return np.where(free_area >= 0, free_area // fillarea, -1).astype(np.int32)
+
+
+# Bounds of the search space for given chip size and core sizes (coreinfo maps core types to Core objects of a solver)
+# The bounds are read from the index file if present, otherwise they are computed and saved to it
+# Arrays are indexed by core counts (i,j,k); all lookups accept arrays of core counts as well
+class BoundIndex:
+    def __init__(self, chipwidth, chipheight, coreinfo, core_order=CORE_ORDER, path=INDEX_PATH):
+        self.path = get_index_path(chipwidth, chipheight, coreinfo, core_order, path)
+        if not os.path.isfile(self.path):
+            bounds = compute_bounds(chipwidth, chipheight, coreinfo, core_order)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Written to a file of its own first, so that concurrent processes never read an incomplete index
+            temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(temp_path, "wb") as indf:
+                np.save(indf, bounds)
+            os.replace(temp_path, self.path)
+        self.fill_ub = np.load(self.path, mmap_mode="r")
+        self.feasible = self.fill_ub >= 0
+
+    # Numbers of cells along the axes, i.e. max. core counts plus one
+    @property
+    def shape(self):
+        return self.fill_ub.shape
+
+    # Number of cells satisfying the chip area constraint, i.e. upper bound for number of feasible solutions
+    def num_feasible(self):
+        return int(np.count_nonzero(self.feasible))
+
+    def is_area_feasible(self, i, j, k):
+        if np.isscalar(i) and np.isscalar(j) and np.isscalar(k):
+            return bool(self.feasible[i, j, k])
+        return self.feasible[i, j, k]
+
+    # Upper bound for number of fill cores (-1 if the chip area constraint is violated)
+    def get_fill_ub(self, i, j, k):
+        if np.isscalar(i) and np.isscalar(j) and np.isscalar(k):
+            return int(self.fill_ub[i, j, k])
+        return np.asarray(self.fill_ub[i, j, k], dtype=np.int64)
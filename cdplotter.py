@@ -7,6 +7,7 @@ import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from layoutstore import LayoutReader
 
 
 CHIPWIDTH = 2400
@@ -73,6 +74,7 @@ def plot_chip_design(xs, ys, ws, hs, types, filename):
 
 
 # Argument to be passed: input file name (including path)
+# Alternatively: layout store (including path, without suffix, cf. layoutstore.py) and configuration, e.g. /tmp/layouts_strippacking 2 1 3
 def main():
     if len(sys.argv) < 2:
         print("Please specify input file (including path)!")
@@ -80,17 +82,22 @@ def main():
     else:
         input_file = sys.argv[1]
 
-    chip_df = pd.read_csv(input_file, names=["x", "y", "w", "h", "type"])
-    
-    xs = chip_df["x"].tolist()
+    if len(sys.argv) >= 5:
+        layouts = LayoutReader(input_file)
+        xs, ys, ws, hs, types = layouts.get_cores(int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+        input_file = "{} ({},{},{})".format(input_file, sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        chip_df = pd.read_csv(input_file, names=["x", "y", "w", "h", "type"])
+        xs = chip_df["x"].tolist()
+        ys = chip_df["y"].tolist()
+        ws = chip_df["w"].tolist()
+        hs = chip_df["h"].tolist()
+        types = chip_df["type"].tolist()
+
     xs = [x/SCALING_FACTOR for x in xs]
-    ys = chip_df["y"].tolist()
     ys = [y/SCALING_FACTOR for y in ys]
-    ws = chip_df["w"].tolist()
     ws = [w/SCALING_FACTOR for w in ws]
-    hs = chip_df["h"].tolist()
     hs = [h/SCALING_FACTOR for h in hs]
-    types = chip_df["type"].tolist()
     print(types)
 
     plot_chip_design(xs, ys, ws, hs, types, input_file)
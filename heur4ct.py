@@ -6,17 +6,43 @@ Computes all max. configurations of heterogeneous chip with up to four core type
 import time
 import sys
 import random
-import os
+import multiprocessing
+import functools
 from shapely.geometry import Polygon
 from shapely.geometry import Point
 from shapely import affinity
 from itertools import permutations
 import matplotlib.pyplot as plt
+from layoutstore import LayoutWriter
+from resultsink import ResultSink, get_checkpoint_file
+from nonproximity import NonproximityWriter
+from instrumentation import Instrumentation, timed_phase
+from sweeputils import pop_option, pop_flag, SweepPruner, sweep_cells, load_checkpoint
+from boundindex import BoundIndex
 
 
 CHIPWIDTH = None # 2400 # 3200 #2400
 CHIPHEIGHT = None # 2400 # 3200 #2400
 CORE_ORDER = ["big", "A72", "Mali", "LITTLE"]
+RANDOM_SEED = 1337
+WORKER_CHUNKSIZE = 16
+# Layouts explored are saved to a layout store (cf. layoutstore.py) per placement order
+LAYOUT_STORE = "/tmp/layouts_heuristic_{}"
+# Placement orders not depending on core counts, for which infeasibility carries over to larger core counts
+FIXED_PLACEMENT_ORDERS = ["default", "corearea"]
+PARTITION_CACHE_SIZE = 1024
+GEOMETRY_CACHE_SIZE = 65536
+# Functions accounted to phases if instrumentation is enabled (option --instrument)
+INSTRUMENTED_PHASES = {
+    "get_partitions": "partitions",
+    "get_staircase_extents": "conflict checks",
+    "is_conflicting": "conflict checks",
+    "get_staircase_profile": "fill",
+    "count_fill": "fill",
+    "fill_chip": "fill",
+    "get_core_coords": "coordinates"
+}
+INSTRUMENTATION = None
 
 
 class Core:
@@ -116,54 +142,178 @@ def get_polygon_coordinates(configuration, corewidth, coreheight):
 #             numcols -= 1
 #         fillconfig.append(numcols)
 #     return fillconfig
+
+
+# Rotates the point (x,y) clockwise by rot degrees (-90, -180 or -270, as passed to affinity.rotate) about the chip center
+# Integer counterpart of affinity.rotate, chip dimensions are multiples of 100 so that the center is integral
+def rotate_point(x, y, rot):
+    if rot == 0:
+        return x, y
+    elif rot == -90:
+        return y + (CHIPWIDTH - CHIPHEIGHT) // 2, (CHIPWIDTH + CHIPHEIGHT) // 2 - x
+    elif rot == -180:
+        return CHIPWIDTH - x, CHIPHEIGHT - y
+    elif rot == -270:
+        return (CHIPWIDTH + CHIPHEIGHT) // 2 - y, x + (CHIPHEIGHT - CHIPWIDTH) // 2
+    else:
+        raise ValueError("Rotation angle not supported!")
+
+
+# Computes the rectangles (x0,y0,x1,y1) covering the polygon of a given configuration (one per row of cores),
+# assuming it is placed in the bottom left corner and rotated clockwise by rot degrees about the chip center
+def get_staircase_rectangles(configuration, corewidth, coreheight, rot):
+    rectangles = []
+    for row in range(len(configuration)):
+        if configuration[row] == 0:
+            continue
+        xa, ya = rotate_point(0, row*coreheight, rot)
+        xb, yb = rotate_point(configuration[row]*corewidth, (row+1)*coreheight, rot)
+        rectangles.append((min(xa, xb), min(ya, yb), max(xa, xb), max(ya, yb)))
+    return rectangles
+
+
+# Computes for each row of cores of given type the ranges of columns (firstcol,lastcol) blocked by the given rectangles
+# As in the polygon-based check, cores merely touching a rectangle are considered blocked
+def get_fill_profile(rectangles, coretype):
+    corewidth = COREINFO[coretype].width
+    coreheight = COREINFO[coretype].height
+    maxrows = COREINFO[coretype].maxrows
+    maxcols = COREINFO[coretype].maxcols
+    profile = [[] for _ in range(maxrows)]
+    for x0, y0, x1, y1 in rectangles:
+        firstcol = max(0, -(-x0 // corewidth) - 1)
+        lastcol = min(maxcols - 1, x1 // corewidth)
+        if firstcol > lastcol:
+            continue
+        firstrow = max(0, -(-y0 // coreheight) - 1)
+        lastrow = min(maxrows - 1, y1 // coreheight)
+        for row in range(firstrow, lastrow+1):
+            profile[row].append((firstcol, lastcol))
+    return tuple(tuple(sorted(blocked)) for blocked in profile)
+
+
+# Computes for each row of cores of given row type the ranges of x coordinates (x0,x1) covered by the given rectangles within the row
+# Overlapping or touching ranges are merged; on non-square chips, rotated rectangles may lie partly outside the chip
+def get_row_extents(rectangles, rowtype):
+    coreheight = COREINFO[rowtype].height
+    maxrows = COREINFO[rowtype].maxrows
+    covered = [[] for _ in range(maxrows)]
+    for x0, y0, x1, y1 in rectangles:
+        firstrow = max(0, -(-y0 // coreheight) - 1)
+        lastrow = min(maxrows - 1, y1 // coreheight)
+        for row in range(firstrow, lastrow+1):
+            covered[row].append((x0, x1))
+    extents = []
+    for ranges in covered:
+        merged = []
+        for x0, x1 in sorted(ranges):
+            if merged and x0 <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], x1))
+            else:
+                merged.append((x0, x1))
+        extents.append(tuple(merged))
+    return tuple(extents)
+
+
+# Checks whether configuration of given core type placed in the bottom left corner (without rotation) intersects
+# (or touches) the staircase with given row extents (as returned by get_row_extents for this core type)
+# Row i of the configuration covers x coordinates from 0 to configuration[i]*corewidth
+def is_conflicting(configuration, corewidth, extents):
+    for row in range(len(configuration)):
+        if configuration[row]:
+            for x0, x1 in extents[row]:
+                if x0 <= configuration[row]*corewidth and x1 >= 0:
+                    return True
+    return False
+
+
+# Computes the first run of consecutive free columns in a row given its blocked column ranges
+# Returns first column and number of columns of the run
+def get_free_columns(blocked, maxcols):
+    startcol = 0
+    endcol = maxcols
+    for firstcol, lastcol in sorted(blocked):
+        if firstcol > startcol:
+            endcol = firstcol
+            break
+        startcol = max(startcol, lastcol + 1)
+    if startcol >= maxcols:
+        return 0, 0
+    return startcol, endcol - startcol
+
+
+# Computes the number of cores of given type fill_chip would place, without materializing their positions
+# As corner staircases occupy a prefix and/or suffix of each row on square chips, adding profiles never increases this number there
+def count_fill(profiles, coretype):
+    maxcols = COREINFO[coretype].maxcols
+    numcores = 0
+    for row in range(COREINFO[coretype].maxrows):
+        blocked = [cols for profile in profiles for cols in profile[row]]
+        numcores += get_free_columns(blocked, maxcols)[1]
+    return numcores
+
+
 # Compute configuration for remaining core type which maximizes number of cores placed on chip
-# Polygons represent area already occupied by cores of different types
+# Profiles (as returned by get_fill_profile) represent area already occupied by cores of different types
 # In constrast to other core types, a list of individual core positions is returned!
-def fill_chip(polygons, coretype):
+def fill_chip(profiles, coretype):
     corewidth = COREINFO[coretype].width
     coreheight = COREINFO[coretype].height
     maxrows = COREINFO[coretype].maxrows
     maxcols = COREINFO[coretype].maxcols
     filllist = []
     for row in range(maxrows):
-        #print("row", row)
-        col = 0
-        hasfit = False
-        while col < maxcols:
-            pg = Polygon([(col*corewidth,row*coreheight), (col*corewidth,(row+1)*coreheight), ((col+1)*corewidth,(row+1)*coreheight), ((col+1)*corewidth,row*coreheight)])
-            fit = True
-            for polg in polygons:
-                if pg.intersects(polg):
-                    fit = False
-            if fit:
-                hasfit = True
-                filllist.append(PlacedCore(col*corewidth, row*coreheight, corewidth, coreheight, coretype))
-            else:
-                if hasfit:
-                    break
-            col += 1
+        blocked = [cols for profile in profiles for cols in profile[row]]
+        startcol, numcols = get_free_columns(blocked, maxcols)
+        for col in range(startcol, startcol + numcols):
+            filllist.append(PlacedCore(col*corewidth, row*coreheight, corewidth, coreheight, coretype))
     return filllist
 
 
+# Cached lookups shared across all configurations explored in a run
+# Chip dimensions are part of the key, as they determine COREINFO and the center of rotation
+@functools.lru_cache(maxsize=PARTITION_CACHE_SIZE)
+def get_partitions(coretype, corecount, chipwidth, chipheight):
+    return tuple(tuple(configuration) for configuration in partitions(corecount, COREINFO[coretype].maxcols, COREINFO[coretype].maxrows))
+
+
+# Profile of configuration of given core type placed in the bottom left corner and rotated by rot degrees, w.r.t. fill core type
+@functools.lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def get_staircase_profile(coretype, configuration, rot, fillwith, chipwidth, chipheight):
+    rectangles = get_staircase_rectangles(configuration, COREINFO[coretype].width, COREINFO[coretype].height, rot)
+    return get_fill_profile(rectangles, fillwith)
+
+
+# Row extents of configuration of given core type rotated by rot degrees, w.r.t. rows of cores of row type
+@functools.lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def get_staircase_extents(coretype, configuration, rot, rowtype, chipwidth, chipheight):
+    rectangles = get_staircase_rectangles(configuration, COREINFO[coretype].width, COREINFO[coretype].height, rot)
+    return get_row_extents(rectangles, rowtype)
+
+
+# Caches are referenced here, as their names may be rebound to timed versions by instrumentation
+CACHED_FUNCTIONS = [("partitions", get_partitions), ("staircase profiles", get_staircase_profile), ("staircase extents", get_staircase_extents)]
+
+
+def print_cache_statistics():
+    for name, cached_function in CACHED_FUNCTIONS:
+        info = cached_function.cache_info()
+        lookups = info.hits + info.misses
+        hitrate = info.hits / lookups * 100 if lookups else 0.0
+        print("Cache for {}: {} hits, {} misses ({:4.1f}% hit rate), {} of {} entries used".format(name, info.hits, info.misses, hitrate, info.currsize, info.maxsize))
+
+
 def investigate_design_2ct(corecounts, fillwith):
     coretype = list(corecounts.keys())[0]
     corecount = corecounts[coretype]
-    maxcols = COREINFO[coretype].maxcols
-    maxrows = COREINFO[coretype].maxrows
-    configurations = list(partitions(corecount, maxcols, maxrows))
+    configurations = get_partitions(coretype, corecount, CHIPWIDTH, CHIPHEIGHT)
     best_config = None
     best_filllist = None
     num_fillcores = -1
     for configuration in configurations:
         print(configuration)
-        coords = get_polygon_coordinates(configuration, COREINFO[coretype].width, COREINFO[coretype].height)
-        if coords:
-            polg = Polygon(coords)
-            polg = affinity.rotate(polg, 180, (CHIPWIDTH/2,CHIPHEIGHT/2))
-            polygons = [polg]
-        else:
-            polygons = []
-        filllist = fill_chip(polygons, fillwith)
+        profile = get_staircase_profile(coretype, configuration, -180, fillwith, CHIPWIDTH, CHIPHEIGHT)
+        filllist = fill_chip([profile], fillwith)
         if len(filllist) > num_fillcores:
             best_config = configuration
             best_filllist = filllist
@@ -274,61 +424,60 @@ def investigate_design_4ct(corecounts, fillwith, placement_order):
     #print(ct0, cc0)
     #print(ct1, cc1)
     #print(ct2, cc2)
-    cfsct0 = list(partitions(cc0, COREINFO[ct0].maxcols, COREINFO[ct0].maxrows))
-    cfsct1 = list(partitions(cc1, COREINFO[ct1].maxcols, COREINFO[ct1].maxrows))
-    cfsct2 = list(partitions(cc2, COREINFO[ct2].maxcols, COREINFO[ct2].maxrows))
+    cfsct0 = get_partitions(ct0, cc0, CHIPWIDTH, CHIPHEIGHT)
+    cfsct1 = get_partitions(ct1, cc1, CHIPWIDTH, CHIPHEIGHT)
+    cfsct2 = get_partitions(ct2, cc2, CHIPWIDTH, CHIPHEIGHT)
     # Keep track of best configurations and number of fill cores
     bc0 = None
     bc1 = None
     bc2 = None
     bcf = None
     num_fc = -1
+    # Subtrees are pruned by upper bounds for number of fill cores on square chips only: on other chips, staircases rotated
+    # about the chip center stick out of the chip, such that neither the chip area bound nor the one of count_fill holds
+    bounded = CHIPWIDTH == CHIPHEIGHT
+    # Upper bound for number of fill cores by chip area left after placing all other core types
+    fc_ub = float('inf')
+    if bounded:
+        free_area = CHIPWIDTH*CHIPHEIGHT - sum(cc*COREINFO[ct].width*COREINFO[ct].height for ct, cc in zip(placement_order, [cc0, cc1, cc2]))
+        fc_ub = max(0, free_area // (COREINFO[fillwith].width*COREINFO[fillwith].height))
     for cfct0 in cfsct0:
         #print("cf0:", cfct0)
-        # Compute polygon for first core type configuration and rotate clockwise by 90 degrees
-        coordsct0 = get_polygon_coordinates(cfct0, COREINFO[ct0].width, COREINFO[ct0].height)
-        if coordsct0:
-            #print("Coords for polygon cf0 returned.")
-            pgct0 = Polygon(coordsct0)
-            pgct0_90 = affinity.rotate(pgct0, -90, (CHIPWIDTH/2,CHIPHEIGHT/2))
-            pgct0_180 = affinity.rotate(pgct0, -180, (CHIPWIDTH/2,CHIPHEIGHT/2))
-            pgct0_270 = affinity.rotate(pgct0, -270, (CHIPWIDTH/2,CHIPHEIGHT/2))
-            polygons0 = [pgct0_270]
-        else:
-            polygons0 = []
+        if num_fc >= fc_ub:
+            # Bound reached, no configuration left can yield more fill cores
+            break
+        # Retrieve extents of first core type configuration rotated clockwise by 90 and 180 degrees
+        # w.r.t. rows of second and third core type, respectively
+        exct0_90 = get_staircase_extents(ct0, cfct0, -90, ct1, CHIPWIDTH, CHIPHEIGHT)
+        exct0_180 = get_staircase_extents(ct0, cfct0, -180, ct2, CHIPWIDTH, CHIPHEIGHT)
+        profiles0 = [get_staircase_profile(ct0, cfct0, -270, fillwith, CHIPWIDTH, CHIPHEIGHT)]
+        if bounded and min(count_fill(profiles0, fillwith), fc_ub) <= num_fc:
+            # Subtree cannot beat best configuration found so far, skip
+            continue
         for cfct1 in cfsct1:
             #print("cf1:", cfct1)
-            coordsct1 = get_polygon_coordinates(cfct1, COREINFO[ct1].width, COREINFO[ct1].height)
-            if coordsct1:
-                #print("Coords for polygon cf1 returned.")
-                pgct1 = Polygon(coordsct1)
-                pgct1_90 = affinity.rotate(pgct1, -90, (CHIPWIDTH/2,CHIPHEIGHT/2))
-                pgct1_180 = affinity.rotate(pgct1, -180, (CHIPWIDTH/2,CHIPHEIGHT/2))
-                polygons1 = polygons0 + [pgct1_180]
-                #print(pgct0_90)
-                #print(pgct1)
-                if coordsct0 and pgct1.intersects(pgct0_90):
-                    # If configuration is not feasible, skip
-                    continue
-            else:
-                polygons1 = polygons0
+            if num_fc >= fc_ub:
+                break
+            if is_conflicting(cfct1, COREINFO[ct1].width, exct0_90):
+                # If configuration is not feasible, skip
+                continue
+            exct1_90 = get_staircase_extents(ct1, cfct1, -90, ct2, CHIPWIDTH, CHIPHEIGHT)
+            profiles1 = profiles0 + [get_staircase_profile(ct1, cfct1, -180, fillwith, CHIPWIDTH, CHIPHEIGHT)]
+            if bounded and min(count_fill(profiles1, fillwith), fc_ub) <= num_fc:
+                continue
             for cfct2 in cfsct2:
-                coordsct2 = get_polygon_coordinates(cfct2, COREINFO[ct2].width, COREINFO[ct2].height)
-                if coordsct2:
-                    pgct2 = Polygon(coordsct2)
-                    pgct2_90 = affinity.rotate(pgct2, -90, (CHIPWIDTH/2,CHIPHEIGHT/2))
-                    polygons2 = polygons1 + [pgct2_90]
-                    if coordsct0 and pgct2.intersects(pgct0_180) or coordsct1 and pgct2.intersects(pgct1_90):
-                        continue
-                else:
-                    polygons2 = polygons1
-                filllist = fill_chip(polygons2, fillwith)
-                if len(filllist) > num_fc:
+                if num_fc >= fc_ub:
+                    break
+                if is_conflicting(cfct2, COREINFO[ct2].width, exct0_180) or is_conflicting(cfct2, COREINFO[ct2].width, exct1_90):
+                    continue
+                profiles2 = profiles1 + [get_staircase_profile(ct2, cfct2, -90, fillwith, CHIPWIDTH, CHIPHEIGHT)]
+                num_fill = count_fill(profiles2, fillwith)
+                if num_fill > num_fc:
                     bc0 = cfct0
                     bc1 = cfct1
                     bc2 = cfct2
-                    bcf = filllist
-                    num_fc = len(filllist)
+                    bcf = fill_chip(profiles2, fillwith)
+                    num_fc = num_fill
     cfdict = {}
     if bc0 is not None:
         # Feasible chip design has been found
@@ -446,6 +595,61 @@ def get_placement_order(order, nct0, nct1, nct2):
         raise ValueError("Placement order unknown!")
     return placement_order
 
+# Computes best configuration for core counts (i,j,k) of the first three core types in CORE_ORDER
+# Returns number of fill cores placed, or -1 if no feasible configuration has been found, and layout (None if infeasible)
+def explore_cell(i, j, k, order):
+    # Construct corelist
+    #print("Investigating core counts ({},{},{})".format(i,j,k))
+    corecounts = {}
+    for l in range(len(CORE_ORDER)-1):
+        core = CORE_ORDER[l]
+        if l == 0:
+            numcores = i
+        elif l == 1:
+            numcores = j
+        elif l == 2:
+            numcores = k
+        corecounts[core] = numcores
+    fillwith = CORE_ORDER[-1]
+
+    # Retrieve placement order
+    placement_order = get_placement_order(order, i, j, k)
+
+    best_configs = investigate_design(corecounts, fillwith, placement_order)
+    if best_configs:
+        # Feasible solution available
+        numct3 = len(best_configs[CORE_ORDER[-1]])
+        coresx, coresy, coresw, coresh, corest = get_core_coords(best_configs, placement_order)
+        fillcores = best_configs[fillwith]
+        for fillcore in fillcores:
+            coresx.append(fillcore.x)
+            coresy.append(fillcore.y)
+            coresw.append(fillcore.w)
+            coresh.append(fillcore.h)
+            corest.append(fillcore.t)
+        layout = (coresx, coresy, coresw, coresh, corest)
+    else:
+        numct3 = -1
+        layout = None
+    return numct3, layout
+
+
+# Worker process entry point for parallel exploration
+# Each cell gets its own seed, so that random placement orders do not depend on how cells are sharded
+def explore_cell_seeded(cell):
+    i, j, k, order = cell
+    random.seed("{}_{}_{}_{}".format(RANDOM_SEED, i, j, k))
+    return explore_cell(i, j, k, order)
+
+
+def init_worker(chipwidth, chipheight):
+    global CHIPWIDTH
+    CHIPWIDTH = chipwidth
+    global CHIPHEIGHT
+    CHIPHEIGHT = chipheight
+    set_coreinfo()
+
+
 # Arguments to be passed: output file (including path), placement order (i.e. order in which cores are to be placed), input file (optional)
 # Example: maxconf4ct.py ./input_maxconf4ct.csv ./configuration_maxconf4ct.csv
 # Format for input file:
@@ -458,8 +662,30 @@ def get_placement_order(order, nct0, nct1, nct2):
 # Mali,4
 # 
 # If no input file is passed, the search space is systematically explored
+# Option --workers N explores the search space using N worker processes
+# (in this case, random placement orders are seeded per configuration rather than once per run)
+# On square chips, configurations violating the chip area constraint (cf. boundindex.py) are skipped (i.e., reported as infeasible)
+# without investigation, as are configurations with a component-wise smaller infeasible configuration for placement orders in
+# FIXED_PLACEMENT_ORDERS; on other chips, staircases rotated about the chip center stick out of the chip, such that the chip
+# area does not bound the heuristic (cf. investigate_design_4ct), and all configurations are investigated
+# Option --prune-dominated enables the latter for all placement orders and chips (sequential exploration only, results may differ)
+# Option --resume continues an interrupted exploration, skipping all configurations already listed in the output file (or its partial file)
+# Option --instrument FILE appends time spent per phase, wall time and peak memory for the run and each explored
+# configuration (not recorded when exploring with worker processes) to FILE as JSON lines
+# Option --layouts PATH saves layouts to the layout store at PATH instead of LAYOUT_STORE
+# Option --nonproximity FILE also computes nonproximity per core type of each layout right after exploring its
+# configuration, and writes it to FILE (cf. NonproximityWriter in nonproximity.py)
+# Results of explorations are written to a partial file (cf. resultsink.py), replacing the results file once complete
 def main():
-    random.seed(1337)
+    random.seed(RANDOM_SEED)
+    workers = pop_option(sys.argv, "--workers")
+    if workers is not None:
+        workers = int(workers)
+    prune_dominated = pop_flag(sys.argv, "--prune-dominated")
+    resume = pop_flag(sys.argv, "--resume")
+    instrument_file = pop_option(sys.argv, "--instrument")
+    layouts_path = pop_option(sys.argv, "--layouts")
+    nonproximity_file = pop_option(sys.argv, "--nonproximity")
     output_file = sys.argv[1]
     order = sys.argv[2]
     global CHIPWIDTH
@@ -467,6 +693,10 @@ def main():
     global CHIPHEIGHT
     CHIPHEIGHT = int(sys.argv[4]) * 100
     set_coreinfo()
+    global INSTRUMENTATION
+    if instrument_file is not None:
+        INSTRUMENTATION = Instrumentation(instrument_file, {"engine": "heur4ct", "variant": order, "chip": "{}x{}".format(sys.argv[3], sys.argv[4])})
+        INSTRUMENTATION.instrument(globals(), INSTRUMENTED_PHASES)
     if len(sys.argv) >= 6:
         input_file = sys.argv[5]
         corecounts, fillwith, placement_order = read_input(input_file)
@@ -485,9 +715,10 @@ def main():
                 coresw.append(fillcore.w)
                 coresh.append(fillcore.h)
                 corest.append(fillcore.t)
-            with open(output_file, 'w') as outf:
-                for i in range(len(coresx)):
-                    outf.write("{},{},{},{},{}\n".format(coresx[i], coresy[i], coresw[i], coresh[i], corest[i]))
+            with timed_phase(INSTRUMENTATION, "file I/O"):
+                with open(output_file, 'w') as outf:
+                    for i in range(len(coresx)):
+                        outf.write("{},{},{},{},{}\n".format(coresx[i], coresy[i], coresw[i], coresh[i], corest[i]))
         else:
             print("No feasible configuration found for given core counts!")
     elif len(sys.argv) == 5:
@@ -495,51 +726,71 @@ def main():
         maxct0 = COREINFO[CORE_ORDER[0]].maxrows * COREINFO[CORE_ORDER[0]].maxcols
         maxct1 = COREINFO[CORE_ORDER[1]].maxrows * COREINFO[CORE_ORDER[1]].maxcols
         maxct2 = COREINFO[CORE_ORDER[2]].maxrows * COREINFO[CORE_ORDER[2]].maxcols
-
-        for i in range(maxct0+1):
-            for j in range(maxct1+1):
-                for k in range(maxct2+1):
-                    # Construct corelist
-                    #print("Investigating core counts ({},{},{}), max. ({},{},{})".format(i,j,k,maxct0,maxct1,maxct2))
-                    corecounts = {}
-                    for l in range(len(CORE_ORDER)-1):
-                        core = CORE_ORDER[l]
-                        if l == 0:
-                            numcores = i
-                        elif l == 1:
-                            numcores = j
-                        elif l == 2:
-                            numcores = k
-                        corecounts[core] = numcores
-                    fillwith = CORE_ORDER[-1]
-
-                    # Retrieve placement order
-                    placement_order = get_placement_order(order, i, j, k)
-
-                    best_configs = investigate_design(corecounts, fillwith, placement_order)
-                    if best_configs:
-                        # Feasible solution available
-                        numct3 = len(best_configs[CORE_ORDER[-1]])
-                        coresx, coresy, coresw, coresh, corest = get_core_coords(best_configs, placement_order)
-                        fillcores = best_configs[fillwith]
-                        for fillcore in fillcores:
-                            coresx.append(fillcore.x)
-                            coresy.append(fillcore.y)
-                            coresw.append(fillcore.w)
-                            coresh.append(fillcore.h)
-                            corest.append(fillcore.t)
-                        if not os.path.isdir("/tmp/layouts_heuristic_{}".format(order)):
-                            os.mkdir("/tmp/layouts_heuristic_{}".format(order))
-                        with open("/tmp/layouts_heuristic_{}/layout_{}_{}_{}.csv".format(order, i, j, k), 'w') as outf:
-                            for m in range(len(coresx)):
-                                outf.write("{},{},{},{},{}\n".format(coresx[m], coresy[m], coresw[m], coresh[m], corest[m]))
-                    else:
-                        numct3 = -1
-                    with open(output_file, "a") as shf:
-                        shf.write("{},{},{},{}\n".format(i,j,k,numct3))
+        bounds = BoundIndex(CHIPWIDTH, CHIPHEIGHT, COREINFO, CORE_ORDER)
+        # Configurations are only pruned on square chips, cf. investigate_design_4ct
+        square = CHIPWIDTH == CHIPHEIGHT
+
+        layout_store = layouts_path if layouts_path is not None else LAYOUT_STORE.format(order)
+        completed = {}
+        if resume:
+            completed = load_checkpoint(get_checkpoint_file(output_file), sweep_cells(maxct0, maxct1, maxct2), layout_store, CORE_ORDER[-1])
+        with LayoutWriter(layout_store, resume) as layouts, ResultSink(output_file, resume) as sink, NonproximityWriter(nonproximity_file) as metrics:
+            metrics.write_completed(completed, layout_store)
+            if workers is None:
+                pruner = SweepPruner(bounds if square else None, prune_dominated or square and order in FIXED_PLACEMENT_ORDERS)
+                for i in range(maxct0+1):
+                    for j in range(maxct1+1):
+                        for k in range(maxct2+1):
+                            if (i, j, k) in completed:
+                                # Explored before interruption, draw placement order to keep random placement orders in line
+                                get_placement_order(order, i, j, k)
+                                pruner.record(i, j, k, completed[(i, j, k)])
+                                continue
+                            if INSTRUMENTATION is not None:
+                                INSTRUMENTATION.begin_cell()
+                            skipped = pruner.skip(i, j, k)
+                            if skipped:
+                                # Draw placement order nonetheless, so that random placement orders match those of an unpruned sweep
+                                get_placement_order(order, i, j, k)
+                                numct3 = -1
+                                layout = None
+                            else:
+                                numct3, layout = explore_cell(i, j, k, order)
+                            pruner.record(i, j, k, numct3)
+                            with timed_phase(INSTRUMENTATION, "file I/O"):
+                                if layout is not None:
+                                    layouts.write_layout(i, j, k, *layout)
+                                sink.write_result(i, j, k, numct3)
+                            with timed_phase(INSTRUMENTATION, "nonproximity"):
+                                metrics.write(i, j, k, numct3, layout)
+                            if INSTRUMENTATION is not None:
+                                INSTRUMENTATION.end_cell(i, j, k, numct3, skipped=skipped)
+                print("Cells skipped:", pruner.cells_skipped)
+                print_cache_statistics()
+            else:
+                # Shard cells across worker processes, results are collected (and written) in sweep order
+                # On square chips, only cells satisfying the chip area constraint are submitted
+                cells = [(i, j, k, order) for i, j, k in sweep_cells(maxct0, maxct1, maxct2) if (i, j, k) not in completed]
+                tasks = [cell for cell in cells if not square or bounds.is_area_feasible(*cell[:3])]
+                with multiprocessing.Pool(workers, initializer=init_worker, initargs=(CHIPWIDTH, CHIPHEIGHT)) as pool:
+                    results = zip(tasks, pool.imap(explore_cell_seeded, tasks, chunksize=WORKER_CHUNKSIZE))
+                    task, (numct3, layout) = next(results, (None, (-1, None)))
+                    for cell in cells:
+                        i, j, k, _ = cell
+                        if cell == task:
+                            if layout is not None:
+                                layouts.write_layout(i, j, k, *layout)
+                            sink.write_result(i, j, k, numct3)
+                            metrics.write(i, j, k, numct3, layout)
+                            task, (numct3, layout) = next(results, (None, (-1, None)))
+                        else:
+                            sink.write_result(i, j, k, -1)
+                            metrics.write(i, j, k, -1)
     else:
         print("Please specify input/output file(s)!")
         sys.exit(1)
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.finish(workers=workers)
 
     # # Plot polygons (useful for debugging of get_core_coords function and cdplotter.py)
     # rot = -270
@@ -0,0 +1,106 @@
+'''
+Opt-in instrumentation of runs and sweep cells of heur4ct.py, stripcd.py and rectpacker.py, written as JSON lines.
+'''
+
+
+import json
+import time
+import resource
+import functools
+import contextlib
+
+
+# Accumulates wall time per phase (e.g. "fill", "file I/O") for the current sweep cell and for the whole run
+# Each finished cell and the run itself are written as a JSON object on a line of their own
+class Instrumentation:
+    def __init__(self, output_file, run_info):
+        self.output_file = output_file
+        self.run_info = run_info
+        self.run_phases = {}
+        self.cell_phases = {}
+        self.num_cells = 0
+        self.run_wall_start = time.perf_counter()
+        self.run_cpu_start = time.process_time()
+        self.cell_wall_start = self.run_wall_start
+        self.cell_cpu_start = self.run_cpu_start
+        self.outf = open(output_file, "a")
+
+    def add_time(self, phase, duration):
+        self.cell_phases[phase] = self.cell_phases.get(phase, 0.0) + duration
+
+    # Wraps function such that time spent in it is accounted to given phase
+    def timed(self, phase, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_time(phase, time.perf_counter() - start)
+        return wrapper
+
+    # Replaces functions in namespace (i.e. globals() of a solver module) by timed versions
+    # phases maps function names to phases
+    def instrument(self, namespace, phases):
+        for name, phase in phases.items():
+            namespace[name] = self.timed(phase, namespace[name])
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def begin_cell(self):
+        self.cell_phases = {}
+        self.cell_wall_start = time.perf_counter()
+        self.cell_cpu_start = time.process_time()
+
+    def end_cell(self, i, j, k, numct3, **info):
+        record = dict(self.run_info)
+        record["cell"] = [i, j, k]
+        record["numct3"] = numct3
+        record.update(info)
+        record["wall_time"] = time.perf_counter() - self.cell_wall_start
+        record["cpu_time"] = time.process_time() - self.cell_cpu_start
+        record["phases"] = self.cell_phases
+        record["peak_memory_kb"] = get_peak_memory()
+        self.write(record)
+        self.merge_phases()
+        self.num_cells += 1
+
+    def merge_phases(self):
+        for phase, duration in self.cell_phases.items():
+            self.run_phases[phase] = self.run_phases.get(phase, 0.0) + duration
+        self.cell_phases = {}
+
+    def finish(self, **info):
+        self.merge_phases()
+        record = dict(self.run_info)
+        record["run"] = True
+        record["cells"] = self.num_cells
+        record.update(info)
+        record["wall_time"] = time.perf_counter() - self.run_wall_start
+        record["cpu_time"] = time.process_time() - self.run_cpu_start
+        record["phases"] = self.run_phases
+        record["peak_memory_kb"] = get_peak_memory()
+        self.write(record)
+        self.outf.close()
+
+    def write(self, record):
+        self.outf.write(json.dumps(record) + "\n")
+        self.outf.flush()
+
+
+# Peak resident set size of this process so far (in kilobytes on Linux)
+def get_peak_memory():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# Returns context accounting time to given phase, or a no-op context if instrumentation is disabled (i.e. None)
+def timed_phase(instrumentation, phase):
+    if instrumentation is None:
+        return contextlib.nullcontext()
+    return instrumentation.phase(phase)
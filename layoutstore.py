@@ -0,0 +1,118 @@
+'''
+Append-only store for the chip layouts computed during search space exploration, replacing one CSV file per configuration.
+'''
+
+
+import os
+import struct
+import numpy as np
+
+
+CORE_TYPES = ["big", "A72", "Mali", "LITTLE"]
+DATA_SUFFIX = ".layouts"
+INDEX_SUFFIX = ".index"
+# Core record: x, y, w, h, core type code (index in CORE_TYPES)
+RECORD_FORMAT = "<ddddB"
+RECORD_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("w", "<f8"), ("h", "<f8"), ("t", "u1")])
+# Index entry: configuration (i,j,k), offset of first core record, number of core records
+INDEX_FORMAT = "<iiiqi"
+INDEX_DTYPE = np.dtype([("i", "<i4"), ("j", "<i4"), ("k", "<i4"), ("offset", "<i8"), ("count", "<i4")])
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+
+
+def layout_store_exists(path):
+    return os.path.isfile(path + DATA_SUFFIX) and os.path.isfile(path + INDEX_SUFFIX)
+
+
+# Appends layouts to the store at path (i.e. files path.layouts and path.index)
+# Layout records are written before their index entry, so that index entries always refer to complete layouts
+# If resume is set, trailing data of an interrupted run not covered by the index is discarded when opening the store,
+# otherwise the store is started afresh (as results files by ResultSink)
+class LayoutWriter:
+    def __init__(self, path, resume=False):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume:
+            self.recover()
+        else:
+            open(path + INDEX_SUFFIX, "wb").close()
+            open(path + DATA_SUFFIX, "wb").close()
+        self.dataf = open(path + DATA_SUFFIX, "ab")
+        self.indexf = open(path + INDEX_SUFFIX, "ab")
+        self.num_records = self.dataf.tell() // RECORD_SIZE
+
+    def recover(self):
+        index_file = self.path + INDEX_SUFFIX
+        data_file = self.path + DATA_SUFFIX
+        if not os.path.isfile(index_file) or not os.path.isfile(data_file):
+            open(index_file, "wb").close()
+            open(data_file, "wb").close()
+            return
+        index_size = os.path.getsize(index_file) // INDEX_SIZE * INDEX_SIZE
+        data_size = 0
+        with open(index_file, "r+b") as indf:
+            indf.truncate(index_size)
+            for entry in struct.iter_unpack(INDEX_FORMAT, indf.read()):
+                data_size = max(data_size, (entry[3] + entry[4]) * RECORD_SIZE)
+        with open(data_file, "r+b") as dataf:
+            dataf.truncate(data_size)
+
+    def write_layout(self, i, j, k, coresx, coresy, coresw, coresh, corest):
+        records = b"".join(struct.pack(RECORD_FORMAT, coresx[m], coresy[m], coresw[m], coresh[m], CORE_TYPES.index(corest[m])) for m in range(len(corest)))
+        self.dataf.write(records)
+        self.dataf.flush()
+        self.indexf.write(struct.pack(INDEX_FORMAT, i, j, k, self.num_records, len(corest)))
+        self.indexf.flush()
+        self.num_records += len(corest)
+
+    def close(self):
+        self.dataf.close()
+        self.indexf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Provides read access to the store at path via memory mapping
+# If a configuration has been written more than once (e.g. after resuming a sweep), its last layout is returned
+class LayoutReader:
+    def __init__(self, path):
+        self.path = path
+        # Ignore incomplete trailing record of a store that is still (or has been interrupted while) being written
+        num_records = os.path.getsize(path + DATA_SUFFIX) // RECORD_SIZE
+        if num_records > 0:
+            self.records = np.memmap(path + DATA_SUFFIX, dtype=RECORD_DTYPE, mode="r", shape=(num_records,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        index_size = os.path.getsize(path + INDEX_SUFFIX) // INDEX_SIZE
+        entries = np.fromfile(path + INDEX_SUFFIX, dtype=INDEX_DTYPE, count=index_size)
+        self.index = {}
+        for entry in entries:
+            if entry["offset"] + entry["count"] <= len(self.records):
+                self.index[(int(entry["i"]), int(entry["j"]), int(entry["k"]))] = (int(entry["offset"]), int(entry["count"]))
+
+    def configurations(self):
+        return list(self.index.keys())
+
+    def __contains__(self, configuration):
+        return tuple(configuration) in self.index
+
+    # Returns core records (structured array with fields x, y, w, h, t) of given configuration without copying
+    def get_layout(self, i, j, k):
+        offset, count = self.index[(i, j, k)]
+        return self.records[offset:offset+count]
+
+    # Returns coordinates and core types of given configuration as lists, as written to layout CSV files
+    def get_cores(self, i, j, k):
+        layout = self.get_layout(i, j, k)
+        corest = [CORE_TYPES[t] for t in layout["t"]]
+        return layout["x"].tolist(), layout["y"].tolist(), layout["w"].tolist(), layout["h"].tolist(), corest
+
+    def count_cores(self, i, j, k, coretype):
+        return int(np.count_nonzero(self.get_layout(i, j, k)["t"] == CORE_TYPES.index(coretype)))
@@ -7,11 +7,20 @@ import sys
 import os
 import pandas as pd
 import math
-from shapely.geometry import Polygon
+import contextlib
+import multiprocessing
+import numpy as np
+from layoutstore import LayoutReader, layout_store_exists, CORE_TYPES
+from resultsink import ResultSink
+from sweeputils import pop_option
 
 
 CORE_ORDER = ["big", "A72", "Mali", "LITTLE"]
 NORMALIZE_PAIRWISE_DISTANCE = True
+# Number of cores of a core type above which closest cores are searched for via a grid rather than among all pairs
+GRID_THRESHOLD = 128
+# Core type names indexed by the core type codes of layout stores
+CORE_TYPE_NAMES = np.array(CORE_TYPES)
 
 
 class Core:
@@ -28,6 +37,7 @@ COREINFO = {
 }
 
 
+# Works on numbers as well as on NumPy arrays (element-wise)
 def compute_normalized_pairwise_dist(x_orig, y_orig, x_dest, y_dest, core_type):
     # Use Manhattan distance
     distance_x = abs(x_orig - x_dest)
@@ -38,99 +48,287 @@ def compute_normalized_pairwise_dist(x_orig, y_orig, x_dest, y_dest, core_type):
     return distance_x + distance_y
 
 
-def compute_core_centers(df_cores):
-    core_centers_x = []
-    core_centers_y = []
-    for index, row in df_cores.iterrows():
-        core_centers_x.append(row['x'] + row['w'] / 2)
-        core_centers_y.append(row['y'] + row['h'] / 2)
-    return core_centers_x, core_centers_y
-
-
-def compute_ct_distance(df_layout, core_type):
-    #print(df_layout)
-    df_cores = df_layout[df_layout["ct"] == core_type]
-    core_polygons = []
-    for index, row in df_cores.iterrows():
-        core_polygons.append(Polygon([(row['x'], row['y']), (row['x'], row['y'] + row['h']), (row['x'] + row['w'], row['y'] + row['h']), (row['x'] + row['w'], row['y'])]))
-    mindists = []
-    for i in range(len(core_polygons)):
-        mindist = float('inf')
-        for j in range(len(core_polygons)):
-            if j != i:
-                pi = core_polygons[i]
-                pj = core_polygons[j]
-                if pi.intersects(pj) and pi.intersection(pj).geom_type != "Point":
-                    # Overlapping should not happen
-                    if pi.intersection(pj).geom_type == "Polygon":
-                        print("Error! Cores overlapping!")
-                    # Intersection is line, therefore minimum distance is 0
-                    mindist = 0
-                    break
-                else:
-                    # Cores are not placed next to each other, compute normalized Manhattan distance
-                    dist = compute_normalized_pairwise_dist(pi.centroid.x, pi.centroid.y, pj.centroid.x, pj.centroid.y, core_type)
-                    if dist < mindist:
-                        mindist = dist
-        mindists.append(mindist)
-    #print("Largest distance {}: {}".format(core_type, largest_pairwise_distance))
-    return max(mindists)
-
-
-# Arguments to be passed: file listing the configurations to be examined (including path)
-def main():
-    if len(sys.argv) < 4:
-        print("Please specify file listing the configurations to be examined, path to layout files, and algorithm")
-        sys.exit(1)
-    df_configs = pd.read_csv(sys.argv[1])
-    layout_path = sys.argv[2]
-    alg = sys.argv[3]
-    print("Examining results for algorithm", alg)
-    #print(df_configs)
-    ct_distances_all = {}
-    nonproximities = []
+def compute_core_centers(x, y, w, h):
+    return x + w / 2, y + h / 2
+
+
+# Checks (element-wise) whether cores a and b share (part of) an edge, and whether they overlap
+# Extents of two cores intersect if they touch or overlap in both dimensions, cores touching in a corner are not adjacent
+def compare_extents(xa, ya, x2a, y2a, xb, yb, x2b, y2b):
+    touch_x = (xa <= x2b) & (xb <= x2a)
+    touch_y = (ya <= y2b) & (yb <= y2a)
+    overlap_x = (xa < x2b) & (xb < x2a)
+    overlap_y = (ya < y2b) & (yb < y2a)
+    return touch_x & touch_y & (overlap_x | overlap_y), overlap_x & overlap_y
+
+
+def report_overlapping(num_overlapping):
+    for _ in range(num_overlapping):
+        # Overlapping should not happen
+        print("Error! Cores overlapping!")
+
+
+# Computes distance of each core to the closest other core, comparing all pairs of cores via broadcasting
+def compute_mindists_all_pairs(x, y, w, h, core_type):
+    x2 = x + w
+    y2 = y + h
+    adjacent, overlapping = compare_extents(x[:, None], y[:, None], x2[:, None], y2[:, None], x[None, :], y[None, :], x2[None, :], y2[None, :])
+    np.fill_diagonal(adjacent, False)
+    np.fill_diagonal(overlapping, False)
+    report_overlapping(np.count_nonzero(overlapping.any(axis=1)))
+    centers_x, centers_y = compute_core_centers(x, y, w, h)
+    distances = compute_normalized_pairwise_dist(centers_x[:, None], centers_y[:, None], centers_x[None, :], centers_y[None, :], core_type)
+    np.fill_diagonal(distances, float('inf'))
+    return np.where(adjacent.any(axis=1), 0, distances.min(axis=1))
+
+
+# Computes distance of each core to the closest other core, comparing each core with the cores in its own and the
+# neighbouring buckets of a grid only
+# Buckets are as large as the largest core, so cores sharing an edge are in neighbouring buckets, and cores in other
+# buckets are farther away than one bucket size in x or y; only cores without another core within this distance are
+# compared with all cores
+def compute_mindists_grid(x, y, w, h, core_type):
+    x2 = x + w
+    y2 = y + h
+    centers_x, centers_y = compute_core_centers(x, y, w, h)
+    bucket_width = w.max()
+    bucket_height = h.max()
+    buckets_x = np.floor(centers_x / bucket_width).astype(np.int64)
+    buckets_y = np.floor(centers_y / bucket_height).astype(np.int64)
+    # Keys of neighbouring buckets differ by 1 in y and by stride in x
+    stride = buckets_y.max() + 3
+    keys = (buckets_x + 1) * stride + buckets_y + 1
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    # Collect pairs of cores in neighbouring buckets
+    pairs_a = []
+    pairs_b = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour_keys = keys + dx * stride + dy
+            first = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+            counts = np.searchsorted(sorted_keys, neighbour_keys, side="right") - first
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            pairs_a.append(np.repeat(np.arange(len(x)), counts))
+            pairs_b.append(order[np.repeat(first, counts) + offsets])
+    a = np.concatenate(pairs_a)
+    b = np.concatenate(pairs_b)
+    distinct = a != b
+    a = a[distinct]
+    b = b[distinct]
+    adjacent, overlapping = compare_extents(x[a], y[a], x2[a], y2[a], x[b], y[b], x2[b], y2[b])
+    report_overlapping(len(np.unique(a[overlapping])))
+    is_adjacent = np.zeros(len(x), dtype=bool)
+    is_adjacent[a[adjacent]] = True
+    mindists = np.full(len(x), float('inf'))
+    np.minimum.at(mindists, a, compute_normalized_pairwise_dist(centers_x[a], centers_y[a], centers_x[b], centers_y[b], core_type))
+    # Smallest distance of cores in other buckets (with some slack for rounding)
+    bound = min(compute_normalized_pairwise_dist(bucket_width, 0, 0, 0, core_type), compute_normalized_pairwise_dist(0, bucket_height, 0, 0, core_type)) * (1 - 1e-9)
+    for core in np.flatnonzero(~is_adjacent & (mindists >= bound)):
+        distances = compute_normalized_pairwise_dist(centers_x[core], centers_y[core], centers_x, centers_y, core_type)
+        distances[core] = float('inf')
+        mindists[core] = distances.min()
+    mindists[is_adjacent] = 0
+    return mindists
+
+
+# Computes nonproximity of core type, i.e. the largest distance of one of its cores to the closest other core of the same type
+# Distance is 0 for cores sharing (part of) an edge, otherwise the normalized Manhattan distance of the core centers
+# x, y, w, h are NumPy arrays holding the cores of given type; for more than GRID_THRESHOLD cores, closest cores are
+# searched for via a grid (cf. compute_mindists_grid) instead of comparing all pairs of cores
+def compute_ct_distance(x, y, w, h, core_type):
+    if len(x) > GRID_THRESHOLD:
+        mindists = compute_mindists_grid(x, y, w, h, core_type)
+    else:
+        mindists = compute_mindists_all_pairs(x, y, w, h, core_type)
+    nonproximity = mindists.max()
+    # Cores sharing an edge with another core have distance 0 (rather than 0.0), as in results nonproximities_*.csv
+    if nonproximity == 0:
+        return 0
+    return float(nonproximity)
+
+
+# Computes nonproximity of each core type with at least 2 cores in layout (coresx, coresy, coresw, coresh, corest)
+# Returns nonproximities per core type, in the order of CORE_ORDER
+def compute_nonproximities(coresx, coresy, coresw, coresh, corest):
+    coresx = np.asarray(coresx, dtype=float)
+    coresy = np.asarray(coresy, dtype=float)
+    coresw = np.asarray(coresw, dtype=float)
+    coresh = np.asarray(coresh, dtype=float)
+    corest = np.asarray(corest)
+    ct_distances = {}
     for ct in CORE_ORDER:
-        ct_distances_all[ct] = []
-    #print(ct_distances_over_lower_bound)
-    for index, row in df_configs.iterrows():
-        #print("Examining configuration ({},{},{})...".format(row[CORE_ORDER[0]], row[CORE_ORDER[1]], row[CORE_ORDER[2]]))
-        df_layout = pd.read_csv(os.path.join(layout_path, "layouts_{}/layout_{}_{}_{}.csv".format(alg, row[CORE_ORDER[0]], row[CORE_ORDER[1]], row[CORE_ORDER[2]])), names=["x", "y", "w", "h", "ct"])
-        ct_distances_config = []
-        for ct in CORE_ORDER:
-            #print(df_layout["ct"].values)
-            if len(df_layout[df_layout["ct"] == ct]) > 1:
-                # There should be at least 2 cores of given type to meaningfully compute nonproximity
-                ct_distance = compute_ct_distance(df_layout, ct)
-                ct_distances_all[ct].append(ct_distance)
-                ct_distances_config.append(ct_distance)
-        #print("Distances for configuration ({},{},{}): {}".format(row[CORE_ORDER[0]], row[CORE_ORDER[1]], row[CORE_ORDER[2]], ct_distances))
-        if max(ct_distances_config) < 0:
-            print("Negative nonproximity for configuration ({},{},{})!".format(row[CORE_ORDER[0]], row[CORE_ORDER[1]], row[CORE_ORDER[2]]))
-        nonproximities.append(sum(ct_distances_config)/len(ct_distances_config))
-    #print("Maximum nonproximities over all core types:", nonproximities)
+        cores = corest == ct
+        # There should be at least 2 cores of given type to meaningfully compute nonproximity
+        if np.count_nonzero(cores) > 1:
+            ct_distances[ct] = compute_ct_distance(coresx[cores], coresy[cores], coresw[cores], coresh[cores], ct)
+    return ct_distances
+
+
+# Writes nonproximity of the layouts computed by a sweep (option --nonproximity FILE of the solvers) as lines
+# i,j,k,#fill cores,nonproximity of big,A72,Mali,LITTLE,average over these core types (as for "all" in nonproximities.csv)
+# Nonproximity is left empty for core types with less than 2 cores and for infeasible configurations
+# Lines are written in sweep order through a ResultSink; does nothing if path is None
+class NonproximityWriter:
+    def __init__(self, path):
+        self.sink = None
+        if path is not None:
+            self.sink = ResultSink(path)
+
+    def write(self, i, j, k, numct3, layout=None):
+        if self.sink is None:
+            return
+        fields = [""] * (len(CORE_ORDER) + 1)
+        if layout is not None:
+            ct_distances = compute_nonproximities(*layout)
+            for ct, ct_distance in ct_distances.items():
+                fields[CORE_ORDER.index(ct)] = ct_distance
+            if ct_distances:
+                fields[-1] = sum(ct_distances.values()) / len(ct_distances)
+        self.sink.write_fields(i, j, k, numct3, *fields)
+
+    # Writes nonproximity of configurations completed before a sweep was interrupted (cf. load_checkpoint), reading
+    # their layouts from the layout store at path layout_store
+    def write_completed(self, completed, layout_store):
+        if self.sink is None or not completed:
+            return
+        layouts = LayoutReader(layout_store)
+        for (i, j, k), numct3 in completed.items():
+            self.write(i, j, k, numct3, layouts.get_cores(i, j, k) if numct3 != -1 else None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.sink is not None:
+            self.sink.__exit__(exc_type, exc_value, traceback)
+
+
+# Layout stores (or directories) examined when passing ALL_ALGORITHMS, i.e. layouts_<algorithm> for all solvers
+ALGORITHMS = ["rectpack_maxrectsrot", "rectpack_maxrectsnorot", "rectpack_guillotinerot", "rectpack_guillotinenorot", "rectpack_skylinerot", "rectpack_skylinenorot", "strippacking", "heuristic_random", "heuristic_totalarea", "heuristic_corearea", "blockpacking"]
+ALL_ALGORITHMS = "all"
+WORKER_CHUNKSIZE = 64
+# Layout path and layout store per algorithm (None if layouts are read from a directory of layout files), set by init_worker
+LAYOUT_PATH = None
+LAYOUTS = None
+
+
+# Max., min. and average of nonproximities, updated as nonproximities are added one at a time
+# Indices of max. and min. refer to the order of adding (first occurrence, as for list.index)
+class Aggregate:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = None
+        self.min = None
+        self.max_index = None
+        self.min_index = None
+
+    def add(self, value):
+        if self.count == 0 or value > self.max:
+            self.max = value
+            self.max_index = self.count
+        if self.count == 0 or value < self.min:
+            self.min = value
+            self.min_index = self.count
+        self.total += value
+        self.count += 1
+
+    def average(self):
+        return self.total / self.count
+
+
+def init_worker(layout_path, algorithms):
+    global LAYOUT_PATH
+    LAYOUT_PATH = layout_path
+    global LAYOUTS
+    LAYOUTS = {}
+    for alg in algorithms:
+        LAYOUTS[alg] = None
+        if layout_store_exists(os.path.join(layout_path, "layouts_{}".format(alg))):
+            LAYOUTS[alg] = LayoutReader(os.path.join(layout_path, "layouts_{}".format(alg)))
+
+
+# Worker process entry point, computes nonproximity per core type for configuration (i,j,k) of given algorithm
+def examine_config(config):
+    alg, i, j, k = config
+    if LAYOUTS[alg] is not None:
+        layout = LAYOUTS[alg].get_layout(i, j, k)
+        return compute_nonproximities(layout["x"], layout["y"], layout["w"], layout["h"], CORE_TYPE_NAMES[layout["t"]])
+    df_layout = pd.read_csv(os.path.join(LAYOUT_PATH, "layouts_{}/layout_{}_{}_{}.csv".format(alg, i, j, k)), names=["x", "y", "w", "h", "ct"])
+    return compute_nonproximities(df_layout["x"], df_layout["y"], df_layout["w"], df_layout["h"], df_layout["ct"])
+
+
+def write_summary(alg, nonproximities, ct_distances_all):
+    print("Examining results for algorithm", alg)
     if not os.path.isfile("./nonproximities.csv"):
         with open("./nonproximities.csv", 'w') as npf:
             npf.write("algorithm,core type,max. nonproximity,min. nonproximity,avg. nonproximity\n")
-    maxnp = max(nonproximities)
-    minnp = min(nonproximities)
-    avgnp = sum(nonproximities)/len(nonproximities)
-    print("Maximum nonproximity over all core types and configurations: {} at index {}".format(maxnp, nonproximities.index(maxnp)))
-    print("Minimum nonproximity over all core types and configurations: {} at index {}".format(minnp, nonproximities.index(minnp)))
+    maxnp = nonproximities.max
+    minnp = nonproximities.min
+    avgnp = nonproximities.average()
+    print("Maximum nonproximity over all core types and configurations: {} at index {}".format(maxnp, nonproximities.max_index))
+    print("Minimum nonproximity over all core types and configurations: {} at index {}".format(minnp, nonproximities.min_index))
     print("Average nonproximity over all core types and configurations:", avgnp)
     with open("./nonproximities.csv", 'a') as npf:
         npf.write("{},{},{},{},{}\n".format(alg,"all",maxnp,minnp,avgnp))
         for ct in CORE_ORDER:
             distances = ct_distances_all[ct]
-            if distances:
-                maxnpct = max(distances)
-                minnpct = min(distances)
-                avgnpct = sum(distances)/len(distances)
+            if distances.count:
+                maxnpct = distances.max
+                minnpct = distances.min
+                avgnpct = distances.average()
                 npf.write("{},{},{},{},{}\n".format(alg, ct, maxnpct, minnpct, avgnpct))
-                print("Maximum nonproximity over all configurations for core type {}: {} at index {}".format(ct, maxnpct, distances.index(maxnpct)))
-                print("Minimum nonproximity over all configurations for core type {}: {} at index {}".format(ct, minnpct, distances.index(minnpct)))
+                print("Maximum nonproximity over all configurations for core type {}: {} at index {}".format(ct, maxnpct, distances.max_index))
+                print("Minimum nonproximity over all configurations for core type {}: {} at index {}".format(ct, minnpct, distances.min_index))
                 print("Average nonproximity over all configurations for core type {}: {}".format(ct, avgnpct))
     print("Examination of results for algorithm {} terminated.".format(alg))
 
 
+# Arguments to be passed: file listing the configurations to be examined (including path), path to layouts, algorithm
+# Layouts are read from layout store layouts_<algorithm> (cf. layoutstore.py) if present, else from directory layouts_<algorithm>
+# Several algorithms can be passed separated by commas (e.g. strippacking,heuristic_random), or ALL_ALGORITHMS for
+# all algorithms in ALGORITHMS; configurations of all of them are then streamed through a pool of worker processes (as
+# many as CPUs, or as given by option --workers N, which also enables worker processes for a single algorithm)
+# Summaries are appended to ./nonproximities.csv per algorithm, in the order given
+def main():
+    workers = pop_option(sys.argv, "--workers")
+    if workers is not None:
+        workers = int(workers)
+    if len(sys.argv) < 4:
+        print("Please specify file listing the configurations to be examined, path to layout files, and algorithm")
+        sys.exit(1)
+    df_configs = pd.read_csv(sys.argv[1])
+    layout_path = sys.argv[2]
+    algorithms = ALGORITHMS if sys.argv[3] == ALL_ALGORITHMS else sys.argv[3].split(",")
+    configs = df_configs[CORE_ORDER[:3]].to_numpy().tolist()
+    tasks = ((alg, i, j, k) for alg in algorithms for i, j, k in configs)
+    with contextlib.ExitStack() as stack:
+        if len(algorithms) > 1 or workers is not None:
+            pool = stack.enter_context(multiprocessing.Pool(workers, initializer=init_worker, initargs=(layout_path, algorithms)))
+            results = pool.imap(examine_config, tasks, chunksize=WORKER_CHUNKSIZE)
+        else:
+            init_worker(layout_path, algorithms)
+            results = map(examine_config, tasks)
+        # Results arrive in the order of tasks, i.e. configuration by configuration for one algorithm after the other
+        for alg in algorithms:
+            nonproximities = Aggregate()
+            ct_distances_all = {}
+            for ct in CORE_ORDER:
+                ct_distances_all[ct] = Aggregate()
+            for i, j, k in configs:
+                ct_distances = next(results)
+                for ct, ct_distance in ct_distances.items():
+                    ct_distances_all[ct].add(ct_distance)
+                ct_distances_config = list(ct_distances.values())
+                if not ct_distances_config:
+                    print("No core type with at least 2 cores in configuration ({},{},{}) of algorithm {}!".format(i, j, k, alg))
+                    continue
+                if max(ct_distances_config) < 0:
+                    print("Negative nonproximity for configuration ({},{},{})!".format(i, j, k))
+                nonproximities.add(sum(ct_distances_config)/len(ct_distances_config))
+            write_summary(alg, nonproximities, ct_distances_all)
+
+
 if __name__ == "__main__":
     main()
@@ -7,13 +7,36 @@ import rectpack
 import time
 import sys
 import os
+import contextlib
+import multiprocessing
+from layoutstore import LayoutWriter
+from resultsink import ResultSink, get_checkpoint_file
+from nonproximity import NonproximityWriter
+from instrumentation import Instrumentation, timed_phase
+from sweeputils import pop_option, pop_flag, SweepPruner, sweep_cells, load_checkpoint
+from boundindex import BoundIndex
 
 
 CHIPWIDTH = None # 2400 # 3200
 CHIPHEIGHT = None # 2400 # 3200
 ROTATION_ALLOWED = None # False
 CORE_ORDER = ["big", "A72", "Mali", "LITTLE"]
+# Layouts explored are saved to a layout store (cf. layoutstore.py) per packing algorithm
+LAYOUT_STORE = "/tmp/layouts_rectpack_{}"
 PACKING_ALGORITHM = None # rectpack.MaxRectsBssf # rectpack.GuillotineBssfSas # rectpack.SkylineBl
+# Packing algorithm and whether rotation is allowed per algorithm variant (as passed on the command line)
+PACKING_ALGORITHMS = {
+    "maxrectsrot": (rectpack.MaxRectsBssf, True),
+    "maxrectsnorot": (rectpack.MaxRectsBssf, False),
+    "guillotinerot": (rectpack.GuillotineBssfSas, True),
+    "guillotinenorot": (rectpack.GuillotineBssfSas, False),
+    "skylinerot": (rectpack.SkylineBl, True),
+    "skylinenorot": (rectpack.SkylineBl, False)
+}
+# Passed instead of a packing algorithm, explores the search space with all variants in PACKING_ALGORITHMS
+ALL_VARIANTS = "all"
+WORKER_CHUNKSIZE = 16
+INSTRUMENTATION = None
 
 
 class Core:
@@ -44,6 +67,12 @@ def set_coreinfo():
 # }
 
 
+def set_packing_algorithm(alg):
+    global PACKING_ALGORITHM
+    global ROTATION_ALLOWED
+    PACKING_ALGORITHM, ROTATION_ALLOWED = PACKING_ALGORITHMS[alg]
+
+
 def read_input(input_file):
     corecounts = {}
     placement_order = []
@@ -58,37 +87,262 @@ def read_input(input_file):
     return corecounts, fillwith, placement_order
 
 
+# Constructs rectangle queue for core counts (i,j,k): cores of the first three core types in CORE_ORDER, followed by
+# maxrows * maxcols cores of the fourth
+# Returns rectangles (width, height, id) and core type per rectangle id
+def get_rectangles(i, j, k):
+    #print("Investigating core counts ({},{},{})".format(i,j,k))
+    rectid = 0
+    rectangles = []
+    rectangle_types = {}
+    for l in range(len(CORE_ORDER)):
+        core = CORE_ORDER[l]
+        if l == 0:
+            numrects = i
+        elif l == 1:
+            numrects = j
+        elif l == 2:
+            numrects = k
+        elif l == 3:
+            numrects = COREINFO[core].maxrows * COREINFO[core].maxcols
+        for _ in range(numrects):
+            rectangles.append((COREINFO[core].width, COREINFO[core].height, rectid))
+            rectangle_types[rectid] = core
+            rectid += 1
+    return rectangles, rectangle_types
+
+
+# Packs cores for core counts (i,j,k) of the first three core types in CORE_ORDER, followed by as many cores of the fourth as fit
+# Returns number of cores of the fourth type and layout (coresx, coresy, coresw, coresh, corest), or -1 and None if infeasible
+def explore_cell(i, j, k):
+    with timed_phase(INSTRUMENTATION, "queue construction"):
+        rectangles, rectangle_types = get_rectangles(i, j, k)
+    return pack_rectangles(i, j, k, rectangles, rectangle_types)
+
+
+# Packs rectangle queue of core counts (i,j,k) (cf. get_rectangles) with the current packing algorithm
+def pack_rectangles(i, j, k, rectangles, rectangle_types):
+    with timed_phase(INSTRUMENTATION, "queue construction"):
+        bins = [(CHIPWIDTH,CHIPHEIGHT)]
+
+        packer = rectpack.newPacker(mode=rectpack.PackingMode.Offline, pack_algo=PACKING_ALGORITHM, sort_algo=rectpack.SORT_NONE, rotation=ROTATION_ALLOWED)
+
+        # Add the rectangles to packing queue
+        for r in rectangles:
+            packer.add_rect(*r)
+
+        # Add the bins where the rectangles will be placed
+        for b in bins:
+            packer.add_bin(*b)
+
+    # Start packing
+    with timed_phase(INSTRUMENTATION, "packing"):
+        packer.pack()
+
+    # Count cores
+    numcts = [0] * 4
+
+    all_rects = packer.rect_list()
+    for rect in all_rects:
+        b, x, y, w, h, rid = rect
+        ct = rectangle_types[rid]
+        ctid = CORE_ORDER.index(ct)
+        numcts[ctid] += 1
+        #print(b, x, y, w, h, rid)
+
+    #print("Core counts placed: {} {} {} {}".format(*numcts))
+    if numcts[0] == i and numcts[1] == j and numcts[2] == k:
+        # Solution is feasible, save number of cores of fourth type added to chip
+        numct3 = numcts[3]
+        coresx = [x for b, x, y, w, h, rid in all_rects]
+        coresy = [y for b, x, y, w, h, rid in all_rects]
+        coresw = [w for b, x, y, w, h, rid in all_rects]
+        coresh = [h for b, x, y, w, h, rid in all_rects]
+        corest = [rectangle_types[rid] for b, x, y, w, h, rid in all_rects]
+        return numct3, (coresx, coresy, coresw, coresh, corest)
+    return -1, None
+
+
+# Same as explore_cell, but packs the cores of the first three core types first and abandons infeasible configurations
+# as soon as one of them cannot be placed
+# As rectangles are packed one by one in queue order and a rectangle that cannot be placed leaves the chip unchanged,
+# layouts are identical to those of explore_cell. Fill cores are added until one cannot be placed (no further one of
+# the same size can be placed then) or the free chip area is used up, instead of queueing maxrows * maxcols of them.
+def explore_cell_early_exit(i, j, k):
+    with timed_phase(INSTRUMENTATION, "packing"):
+        packing_bin = PACKING_ALGORITHM(CHIPWIDTH, CHIPHEIGHT, rot=ROTATION_ALLOWED)
+        rectid = 0
+        rectangle_types = {}
+        free_area = CHIPWIDTH * CHIPHEIGHT
+        for core, numrects in zip(CORE_ORDER, [i, j, k]):
+            for _ in range(numrects):
+                if not packing_bin.add_rect(COREINFO[core].width, COREINFO[core].height, rectid):
+                    return -1, None
+                rectangle_types[rectid] = core
+                rectid += 1
+            free_area -= numrects * COREINFO[core].width * COREINFO[core].height
+        fillwith = CORE_ORDER[3]
+        numfill = min(COREINFO[fillwith].maxrows * COREINFO[fillwith].maxcols, free_area // (COREINFO[fillwith].width * COREINFO[fillwith].height))
+        numct3 = 0
+        while numct3 < numfill and packing_bin.add_rect(COREINFO[fillwith].width, COREINFO[fillwith].height, rectid):
+            rectangle_types[rectid] = fillwith
+            rectid += 1
+            numct3 += 1
+
+    coresx = [rect.x for rect in packing_bin]
+    coresy = [rect.y for rect in packing_bin]
+    coresw = [rect.width for rect in packing_bin]
+    coresh = [rect.height for rect in packing_bin]
+    corest = [rectangle_types[rect.rid] for rect in packing_bin]
+    return numct3, (coresx, coresy, coresw, coresh, corest)
+
+
+# Worker process entry point for exploring several packing algorithm variants
+# Packs configuration with each of the given variants in turn, sharing the rectangle queue between them
+# Returns number of fill cores and layout per variant
+def explore_cell_variants(cell):
+    i, j, k, variants, early_exit = cell
+    if not early_exit:
+        rectangles, rectangle_types = get_rectangles(i, j, k)
+    results = []
+    for variant in variants:
+        set_packing_algorithm(variant)
+        if early_exit:
+            results.append(explore_cell_early_exit(i, j, k))
+        else:
+            results.append(pack_rectangles(i, j, k, rectangles, rectangle_types))
+    return results
+
+
+def init_worker(chipwidth, chipheight):
+    global CHIPWIDTH
+    CHIPWIDTH = chipwidth
+    global CHIPHEIGHT
+    CHIPHEIGHT = chipheight
+    set_coreinfo()
+
+
+# Results file of given variant when exploring several variants, e.g. ./solutions_maxrectsrot.csv for output file ./solutions.csv
+def get_variant_file(output_file, variant):
+    root, ext = os.path.splitext(output_file)
+    return "{}_{}{}".format(root, variant, ext)
+
+
+# Explores search space with several packing algorithm variants in a single pass
+# Configurations are distributed across worker processes (as many as CPUs, or workers if given), results are collected
+# (and written) in sweep order: per variant to its results file (cf. get_variant_file) and layout store, and max. number
+# of fill cores over all variants (as computed by resultsgrouper.py) to output_file
+# When resuming, each variant continues after the configurations completed in its results file, the grouped results are recomputed
+# Nonproximity of layouts (if nonproximity_file is given) is written per variant as well, cf. get_variant_file
+def explore_variants(output_file, variants, workers, resume, layouts_path, early_exit, nonproximity_file):
+    maxct0 = COREINFO[CORE_ORDER[0]].maxrows * COREINFO[CORE_ORDER[0]].maxcols
+    maxct1 = COREINFO[CORE_ORDER[1]].maxrows * COREINFO[CORE_ORDER[1]].maxcols
+    maxct2 = COREINFO[CORE_ORDER[2]].maxrows * COREINFO[CORE_ORDER[2]].maxcols
+    bounds = BoundIndex(CHIPWIDTH, CHIPHEIGHT, COREINFO, CORE_ORDER)
+    cells = list(sweep_cells(maxct0, maxct1, maxct2))
+
+    results_files = [get_variant_file(output_file, variant) for variant in variants]
+    if layouts_path is not None:
+        layout_stores = ["{}_{}".format(layouts_path, variant) for variant in variants]
+    else:
+        layout_stores = [LAYOUT_STORE.format(variant) for variant in variants]
+    completed = [{} for _ in variants]
+    if resume:
+        completed = [load_checkpoint(get_checkpoint_file(results_file), cells, layout_store, CORE_ORDER[-1]) for results_file, layout_store in zip(results_files, layout_stores)]
+    # Only cells satisfying the chip area constraint are submitted, with the variants they have not been completed for
+    tasks = []
+    for cell in cells:
+        pending = tuple(variant for variant, done in zip(variants, completed) if cell not in done)
+        if pending and bounds.is_area_feasible(*cell):
+            tasks.append(cell + (pending, early_exit))
+
+    num_feasible = [0] * len(variants)
+    num_best = [0] * len(variants)
+    with contextlib.ExitStack() as stack:
+        layouts = [stack.enter_context(LayoutWriter(layout_store, resume)) for layout_store in layout_stores]
+        sinks = [stack.enter_context(ResultSink(results_file, resume)) for results_file in results_files]
+        grouped = stack.enter_context(ResultSink(output_file))
+        metrics = [stack.enter_context(NonproximityWriter(get_variant_file(nonproximity_file, variant) if nonproximity_file is not None else None)) for variant in variants]
+        for m in range(len(variants)):
+            metrics[m].write_completed(completed[m], layout_stores[m])
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(CHIPWIDTH, CHIPHEIGHT)) as pool:
+            results = zip(tasks, pool.imap(explore_cell_variants, tasks, chunksize=WORKER_CHUNKSIZE))
+            task, explored = next(results, (None, None))
+            for cell in cells:
+                i, j, k = cell
+                if task is not None and cell == task[:3]:
+                    cell_results = dict(zip(task[3], explored))
+                    task, explored = next(results, (None, None))
+                else:
+                    cell_results = {}
+                numct3s = []
+                for m, variant in enumerate(variants):
+                    if cell in completed[m]:
+                        numct3 = completed[m][cell]
+                    else:
+                        numct3, layout = cell_results.get(variant, (-1, None))
+                        if layout is not None:
+                            layouts[m].write_layout(i, j, k, *layout)
+                        sinks[m].write_result(i, j, k, numct3)
+                        metrics[m].write(i, j, k, numct3, layout)
+                    numct3s.append(numct3)
+                maxnumct3 = max(numct3s)
+                grouped.write_result(i, j, k, maxnumct3)
+                if maxnumct3 != -1:
+                    for m in range(len(variants)):
+                        num_feasible[m] += numct3s[m] != -1
+                        num_best[m] += numct3s[m] == maxnumct3
+    print("Feasible configurations / configurations with max. fill cores per variant:")
+    for m, variant in enumerate(variants):
+        print("{}: {} / {}".format(variant, num_feasible[m], num_best[m]))
+
+
+# Configurations violating the chip area constraint (cf. boundindex.py) are skipped (i.e., reported as infeasible) without packing
+# Option --prune-dominated also skips configurations with a component-wise smaller infeasible configuration
+# (packing algorithms are not monotone in the core counts, so results may differ)
+# Option --resume continues an interrupted exploration, skipping all configurations already listed in the output file (or its partial file)
+# Option --instrument FILE appends time spent per phase, wall time and peak memory for the run and each explored
+# configuration to FILE as JSON lines
+# Option --layouts PATH saves layouts to the layout store at PATH instead of LAYOUT_STORE
+# Option --nonproximity FILE also computes nonproximity per core type of each layout right after exploring its
+# configuration, and writes it to FILE (cf. NonproximityWriter in nonproximity.py)
+# Option --early-exit packs required cores before fill cores and abandons a configuration once a required core cannot be
+# placed (cf. explore_cell_early_exit), results and layouts are the same
+# Passing several packing algorithms separated by commas (e.g. maxrectsrot,skylinerot) or ALL_VARIANTS explores the search
+# space with all of them in a single pass (cf. explore_variants), the output file then receives the max. number of fill
+# cores over all of them; configurations are distributed across worker processes (as many as CPUs, or as given by
+# option --workers N), option --prune-dominated is ignored, and option --layouts PATH saves layouts to PATH_<variant>
+# Results of explorations are written to a partial file (cf. resultsink.py), replacing the results file once complete
 def main():
+    prune_dominated = pop_flag(sys.argv, "--prune-dominated")
+    resume = pop_flag(sys.argv, "--resume")
+    instrument_file = pop_option(sys.argv, "--instrument")
+    layouts_path = pop_option(sys.argv, "--layouts")
+    nonproximity_file = pop_option(sys.argv, "--nonproximity")
+    early_exit = pop_flag(sys.argv, "--early-exit")
+    workers = pop_option(sys.argv, "--workers")
+    if workers is not None:
+        workers = int(workers)
     output_file = sys.argv[1]
     alg = sys.argv[2]
-    global PACKING_ALGORITHM
-    if alg == "maxrectsrot":
-        PACKING_ALGORITHM = rectpack.MaxRectsBssf
-        ROTATION_ALLOWED = True
-    elif alg == "maxrectsnorot":
-        PACKING_ALGORITHM = rectpack.MaxRectsBssf
-        ROTATION_ALLOWED = False
-    elif alg == "guillotinerot":
-        PACKING_ALGORITHM = rectpack.GuillotineBssfSas
-        ROTATION_ALLOWED = True
-    elif alg == "guillotinenorot":
-        PACKING_ALGORITHM = rectpack.GuillotineBssfSas
-        ROTATION_ALLOWED = False
-    elif alg == "skylinerot":
-        PACKING_ALGORITHM = rectpack.SkylineBl
-        ROTATION_ALLOWED = True
-    elif alg == "skylinenorot":
-        PACKING_ALGORITHM = rectpack.SkylineBl
-        ROTATION_ALLOWED = False
-    else:
-        print("Packing algorithm unknown! Exiting...")
-        sys.exit(1)
+    variants = list(PACKING_ALGORITHMS.keys()) if alg == ALL_VARIANTS else alg.split(",")
+    for variant in variants:
+        if variant not in PACKING_ALGORITHMS:
+            print("Packing algorithm unknown! Exiting...")
+            sys.exit(1)
+    set_packing_algorithm(variants[0])
     global CHIPWIDTH
     CHIPWIDTH = int(sys.argv[3]) * 100
     global CHIPHEIGHT
     CHIPHEIGHT = int(sys.argv[4]) * 100
     set_coreinfo()
+    global INSTRUMENTATION
+    if instrument_file is not None:
+        INSTRUMENTATION = Instrumentation(instrument_file, {"engine": "rectpacker", "variant": alg, "chip": "{}x{}".format(sys.argv[3], sys.argv[4])})
     if len(sys.argv) >= 6:
+        if len(variants) > 1:
+            print("Please specify a single packing algorithm!")
+            sys.exit(1)
         input_file = sys.argv[5]
         corecounts, fillwith, placement_order = read_input(input_file)
         rectid = 0
@@ -123,78 +377,58 @@ def main():
             for rect in all_rects:
                 b, x, y, w, h, rid = rect
                 cff.write("{},{},{},{},{}\n".format(x, y, w, h, rectangle_types[rid]))
+    elif len(sys.argv) == 5 and len(variants) > 1:
+        explore_variants(output_file, variants, workers, resume, layouts_path, early_exit, nonproximity_file)
     elif len(sys.argv) == 5:
         # Explore search space
         maxct0 = COREINFO[CORE_ORDER[0]].maxrows * COREINFO[CORE_ORDER[0]].maxcols
         maxct1 = COREINFO[CORE_ORDER[1]].maxrows * COREINFO[CORE_ORDER[1]].maxcols
         maxct2 = COREINFO[CORE_ORDER[2]].maxrows * COREINFO[CORE_ORDER[2]].maxcols
+        bounds = BoundIndex(CHIPWIDTH, CHIPHEIGHT, COREINFO, CORE_ORDER)
 
-        for i in range(maxct0+1):
-            for j in range(maxct1+1):
-                for k in range(maxct2+1):
-                    # Construct rectangle queue
-                    #print("Investigating core counts ({},{},{}), max. ({},{},{})".format(i,j,k,maxct0,maxct1,maxct2))
-                    rectid = 0
-                    rectangles = []
-                    rectangle_types = {}
-                    for l in range(len(CORE_ORDER)):
-                        core = CORE_ORDER[l]
-                        if l == 0:
-                            numrects = i
-                        elif l == 1:
-                            numrects = j
-                        elif l == 2:
-                            numrects = k
-                        elif l == 3:
-                            numrects = COREINFO[core].maxrows * COREINFO[core].maxcols
-                        for _ in range(numrects):
-                            rectangles.append((COREINFO[core].width, COREINFO[core].height, rectid))
-                            rectangle_types[rectid] = core
-                            rectid += 1
-                    bins = [(CHIPWIDTH,CHIPHEIGHT)]
-
-                    packer = rectpack.newPacker(mode=rectpack.PackingMode.Offline, pack_algo=PACKING_ALGORITHM, sort_algo=rectpack.SORT_NONE, rotation=ROTATION_ALLOWED)
-
-                    # Add the rectangles to packing queue
-                    for r in rectangles:
-                        packer.add_rect(*r)
-
-                    # Add the bins where the rectangles will be placed
-                    for b in bins:
-                        packer.add_bin(*b)
-
-                    # Start packing
-                    packer.pack()
-
-                    # Count cores
-                    numcts = [0] * 4
-
-                    all_rects = packer.rect_list()
-                    for rect in all_rects:
-                        b, x, y, w, h, rid = rect
-                        ct = rectangle_types[rid]
-                        ctid = CORE_ORDER.index(ct)
-                        numcts[ctid] += 1
-                        #print(b, x, y, w, h, rid)
-
-                    #print("Core counts placed: {} {} {} {}".format(*numcts))
-                    if numcts[0] == i and numcts[1] == j and numcts[2] == k:
-                        # Solution is feasible, save number of cores of fourth type added to chip
-                        numct3 = numcts[3]
-                        # Save layout information to file
-                        if not os.path.isdir("/tmp/layouts_rectpack_{}".format(alg)):
-                            os.mkdir("/tmp/layouts_rectpack_{}".format(alg))
-                        with open("/tmp/layouts_rectpack_{}/layout_{}_{}_{}.csv".format(alg, i, j, k), 'w') as cff:
-                            for rect in all_rects:
-                                b, x, y, w, h, rid = rect
-                                cff.write("{},{},{},{},{}\n".format(x, y, w, h, rectangle_types[rid]))
-                    else:
-                        numct3 = -1
-                    with open(output_file, "a") as srf:
-                        srf.write("{},{},{},{}\n".format(i,j,k,numct3))
+        layout_store = layouts_path if layouts_path is not None else LAYOUT_STORE.format(alg)
+        completed = {}
+        if resume:
+            completed = load_checkpoint(get_checkpoint_file(output_file), sweep_cells(maxct0, maxct1, maxct2), layout_store, CORE_ORDER[-1])
+        with LayoutWriter(layout_store, resume) as layouts, ResultSink(output_file, resume) as sink, NonproximityWriter(nonproximity_file) as metrics:
+            metrics.write_completed(completed, layout_store)
+            pruner = SweepPruner(bounds, prune_dominated)
+            for i in range(maxct0+1):
+                for j in range(maxct1+1):
+                    for k in range(maxct2+1):
+                        if (i, j, k) in completed:
+                            pruner.record(i, j, k, completed[(i, j, k)])
+                            continue
+                        if INSTRUMENTATION is not None:
+                            INSTRUMENTATION.begin_cell()
+                        if pruner.skip(i, j, k):
+                            pruner.record(i, j, k, -1)
+                            with timed_phase(INSTRUMENTATION, "file I/O"):
+                                sink.write_result(i, j, k, -1)
+                                metrics.write(i, j, k, -1)
+                            if INSTRUMENTATION is not None:
+                                INSTRUMENTATION.end_cell(i, j, k, -1, skipped=True)
+                            continue
+                        if early_exit:
+                            numct3, layout = explore_cell_early_exit(i, j, k)
+                        else:
+                            numct3, layout = explore_cell(i, j, k)
+                        if layout is not None:
+                            with timed_phase(INSTRUMENTATION, "file I/O"):
+                                layouts.write_layout(i, j, k, *layout)
+                        pruner.record(i, j, k, numct3)
+                        with timed_phase(INSTRUMENTATION, "file I/O"):
+                            sink.write_result(i, j, k, numct3)
+                        with timed_phase(INSTRUMENTATION, "nonproximity"):
+                            metrics.write(i, j, k, numct3, layout)
+                        if INSTRUMENTATION is not None:
+                            INSTRUMENTATION.end_cell(i, j, k, numct3, skipped=False)
+        print("Cells skipped:", pruner.cells_skipped)
     else:
         print("Please specify input/output file(s)!")
         sys.exit(1)
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.finish(workers=workers)
 
 
 if __name__ == "__main__":
@@ -1,42 +1,56 @@
 '''
 Parses results files and produces histograms for each input.
+Results files are joined on the core counts (big, A72, Mali); the functions below can also be imported for analyses of
+results files of other chip sizes or solvers.
 '''
 
 
-import math
 import os
+import sys
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from collections import Counter
+from sweeputils import pop_option, pop_flag
+from boundindex import BoundIndex
 
 
 CHIPWIDTH = 1600 # 3200 #2400
 CHIPHEIGHT = 1600 # 3200 #2400
+KEY_COLUMNS = ["big", "A72", "Mali"]
 
 
 class Core:
-    def __init__(self, width, height):
+    def __init__(self, width, height, chipwidth, chipheight):
         self.width = width
         self.height = height
-        self.maxrows = int(CHIPHEIGHT // height)
-        self.maxcols = int(CHIPWIDTH // width)
+        self.maxrows = int(chipheight // height)
+        self.maxcols = int(chipwidth // width)
 
 
-COREINFO= {
-    "big": Core(500,380),
-    "LITTLE": Core(210,181),
-    "A72": Core(583,469),
-    "Mali": Core(449,394)
-}
+# Returns core info (i.e. Core objects per core type) for chip of given size
+def get_coreinfo(chipwidth, chipheight):
+    return {
+        "big": Core(500,380, chipwidth, chipheight),
+        "LITTLE": Core(210,181, chipwidth, chipheight),
+        "A72": Core(583,469, chipwidth, chipheight),
+        "Mali": Core(449,394, chipwidth, chipheight)
+    }
 
 # Hypothetical square cores
-# COREINFO= {
-#     "big": Core(436,436),
-#     "LITTLE": Core(195,195),
-#     "A72": Core(523,523),
-#     "Mali": Core(421,421)
+# return {
+#     "big": Core(436,436, chipwidth, chipheight),
+#     "LITTLE": Core(195,195, chipwidth, chipheight),
+#     "A72": Core(523,523, chipwidth, chipheight),
+#     "Mali": Core(421,421, chipwidth, chipheight)
 # }
 
+
+# Returns chip width and height for chip size WxH (in mm, e.g. 32x32)
+def parse_chip(chip):
+    chipwidth, chipheight = [int(size) * 100 for size in chip.split("x")]
+    return chipwidth, chipheight
+
 TITLES = {
     "solutions_rectpack_maxrects_rot": "rectpack (MaxRects), rotation allowed",
     "solutions_rectpack_maxrects_norot": "rectpack (MaxRects), rotation not allowed",
@@ -51,149 +65,175 @@ TITLES = {
     "solutions_heuristic_random": "corner heuristic, random placement order",
     "solutions_heuristic_totalarea": "corner heuristic, sorted by total area",
     "solutions_heuristic_corearea": "corner heuristic, sorted by core area",
-    "solutions_heuristic_grouped": "corner heuristic"
+    "solutions_heuristic_grouped": "corner heuristic",
+    "solutions_blockpacking": "block packing"
 }
 
-INPUT_PATH = "./results_16x16" # "./results_32x32" # "./results_24x24" # "./results_32x32_square" # "./results_24x24_square" 
+INPUT_PATH = "./results_16x16" # "./results_32x32" # "./results_24x24" # "./results_32x32_square" # "./results_24x24_square"
 RESULTS_FILENAME = "./filenames_grouped.csv" # "./filenames_all.csv" # "./filenames_grouped.csv"
-
-# Areas for chip and all core types
-a_big = COREINFO["big"].width * COREINFO["big"].height
-a_a72 = COREINFO["A72"].width * COREINFO["A72"].height
-a_mali = COREINFO["Mali"].width * COREINFO["Mali"].height
-a_little = COREINFO["LITTLE"].width * COREINFO["LITTLE"].height
-a_chip = CHIPWIDTH * CHIPHEIGHT
-
-res_dfs = []
-with open(RESULTS_FILENAME, "r") as resf:
-    filenames = resf.readlines()
-filenames = [filename.strip() for filename in filenames]
-littlecolnames = []
-
-for filename in filenames:
-    littlecolname = "LITTLE_" + os.path.splitext(filename)[0]
-    littlecolnames.append(littlecolname)
-    df = pd.read_csv(os.path.join(INPUT_PATH, filename), sep=",", names=["big", "A72", "Mali", littlecolname])
-    res_dfs.append(df)
-
-# Determine upper bound for number of feasible solutions by chip area constraint
-ub_feas = 0
-for i in range(COREINFO["big"].maxrows * COREINFO["big"].maxcols + 1):
-    for j in range(COREINFO["A72"].maxrows * COREINFO["A72"].maxcols + 1):
-        for k in range(COREINFO["Mali"].maxrows * COREINFO["Mali"].maxcols + 1):
-            if CHIPWIDTH*CHIPHEIGHT - i*a_big - j*a_a72 - k*a_mali >= 0:
-                ub_feas += 1
-print("Upper bound for number of feasible solutions:", ub_feas)
-
-df = res_dfs[0].copy()
-for i in range(1, len(res_dfs)):
-    littlecol = res_dfs[i].iloc[:,-1:]
-    # ASSUMES IDENTICAL ORDER IN ALL RESULTS FILES!!
-    df = pd.concat([df, littlecol], axis=1)
-
-# Construct query strings to obtain all cases where at least one method yields a feasible solution, and all cases where all methods yield feasible solutions
-querystring_exists = ""
-querystring_all = ""
-for i in range(len(littlecolnames)):
-    querystring_exists += littlecolnames[i]
-    querystring_all += littlecolnames[i]
-    querystring_exists += " != -1"
-    querystring_all += " != -1"
-    if i != len(littlecolnames)-1:
-        querystring_exists += " or "
-        querystring_all += " and "
-
-df_feas_exists = df.query(querystring_exists).copy()
-#df_feas_exists.to_csv("./feasible_solution_exists.csv", columns=["big", "A72", "Mali"], index=False)
-df_feas_all = df.query(querystring_all).copy()
-df_feas_all.to_csv("./feasible_solution_all.csv", columns=["big", "A72", "Mali"], index=False)
-print("Cases with at least one feasible solution:", len(df_feas_exists))
-print("Cases with a feasible solution in all cases:", len(df_feas_all))
-print("Number of feasible solutions for...")
-for i in range(len(littlecolnames)):
-    querystring_exists = littlecolnames[i] + " != -1"
-    print("{}: {} ({:4.1f}% of upper bound)".format(TITLES[os.path.splitext(filenames[i])[0]], len(df.query(querystring_exists)), (len(df.query(querystring_exists))/ub_feas)*100))
-
-# Compute upper bounds
-LITTLE_ub_exists = []
-for index, row in df_feas_exists.iterrows():
-    LITTLE_ub_exists.append((a_chip - row["big"] * a_big - row["A72"] * a_a72 - row["Mali"] * a_mali) // a_little)
-df_feas_exists["LITTLE_ub"] = LITTLE_ub_exists
-
-LITTLE_ub_all = []
-for index, row in df_feas_all.iterrows():
-    LITTLE_ub_all.append((a_chip - row["big"] * a_big - row["A72"] * a_a72 - row["Mali"] * a_mali) // a_little)
-df_feas_all["LITTLE_ub"] = LITTLE_ub_all
-
-# Compute distances to upper bound
-distances_exists = [[] for _ in range(len(littlecolnames))]
-for index, row in df_feas_exists.iterrows():
-    for i in range(len(littlecolnames)):
-        if row[littlecolnames[i]] == -1:
-            distances_exists[i].append(-1)
+FEASIBLE_FILE = "./feasible_solution_all.csv"
+HISTOGRAM_FILE = "./results_hist.eps"
+
+
+def get_title(filename):
+    name = os.path.splitext(filename)[0]
+    return TITLES.get(name, name)
+
+
+def read_filenames(results_filename):
+    with open(results_filename, "r") as resf:
+        filenames = resf.readlines()
+    return [filename.strip() for filename in filenames if filename.strip()]
+
+
+# Reads results files (lines big,A72,Mali,#LITTLE) from input_path and joins them on the core counts (big, A72, Mali)
+# Returns data frame sorted by core counts with one column LITTLE_<results file name> per results file (configurations
+# missing from a results file count as infeasible, i.e. -1), and the names of these columns
+def read_results(input_path, filenames):
+    df = None
+    littlecolnames = []
+    for filename in filenames:
+        littlecolname = "LITTLE_" + os.path.splitext(filename)[0]
+        littlecolnames.append(littlecolname)
+        res_df = pd.read_csv(os.path.join(input_path, filename), sep=",", names=KEY_COLUMNS + [littlecolname])
+        # Resumed explorations may list a configuration twice, the last line counts
+        res_df = res_df.drop_duplicates(KEY_COLUMNS, keep="last")
+        if df is None:
+            df = res_df
         else:
-            distances_exists[i].append(row["LITTLE_ub"] - row[littlecolnames[i]])
-
-distances_all = [[] for _ in range(len(littlecolnames))]
-for index, row in df_feas_all.iterrows():
-    for i in range(len(littlecolnames)):
-        distances_all[i].append(row["LITTLE_ub"] - row[littlecolnames[i]])
-
-# Compute number of exclusive solutions
-num_exclusive_solutions = [0] * len(littlecolnames)
-for i in range(len(littlecolnames)):
-    for j in range(len(distances_exists[i])):
-        if distances_exists[i] != -1:
-            is_exclusive = True
-            for k in range(len(littlecolnames)):
-                if k != i and distances_exists[k][j] != -1:
-                    is_exclusive = False
-                    break
-            if is_exclusive:
-                num_exclusive_solutions[i] += 1
-print("Number of exclusive solutions for...")
-for i in range(len(littlecolnames)):
-    print("{}: {}".format(TITLES[os.path.splitext(filenames[i])[0]], num_exclusive_solutions[i]))
-
-# Compute maximum and average distances over all cases for each method
-maxdists_exists = [max(distancelist) for distancelist in distances_exists]
-distances_feas = []
-print("Distances from upper bound (at least one feasible solution):")
-for i in range(len(filenames)):
-    distances_feas.append([distance for distance in distances_exists[i] if distance >= 0])
-    print("{}: maximum: {}, average: {:5.2f}".format(os.path.splitext(filenames[i])[0], maxdists_exists[i], sum(distances_feas[i])/len(distances_feas[i])))
-
-maxdists_all = [max(distancelist) for distancelist in distances_all]
-print("Distances from upper bound (feasible solution for all methods):")
-for i in range(len(filenames)):
-    print("{}: maximum: {}, average: {:5.2f}".format(os.path.splitext(filenames[i])[0], maxdists_all[i], sum(distances_all[i])/len(distances_all[i])))
-
-numrows = 1 # len(filenames) # int(math.ceil(len(filenames) / 2))
-numcols = len(filenames) # 1 # 2
-
-#fig, axes = plt.subplots(numrows,2,sharex=True,sharey=True,figsize=(5*2,5*numrows))
-fig, axes = plt.subplots(numrows,numcols,sharex=True,sharey=True,figsize=(5*numcols,5*numrows))
-# for i in range(numrows):
-#     for j in range(numcols):
-#         if i*numcols+j < len(distances_exists):
-#             axes[i][j].hist(distances_exists[i*numcols+j], maxdists_exists[i*numcols+j]+2)
-#             axes[i][j].set_title(TITLES[os.path.splitext(filenames[i*numcols+j])[0]])
-#             axes[i][j].set_xlabel("distance to upper bound (# LITTLE cores)")
-#             axes[i][j].set_ylabel("# configurations")
-#             axes[i][j].xaxis.set_tick_params(labelbottom=True)
-#             axes[i][j].yaxis.set_tick_params(labelleft=True)
-#for i in range(numrows):
-for i in range(numcols):
-    #axes[i].hist(distances_exists[i], maxdists_exists[i]+2)
-    print(maxdists_all[i])
-    print(Counter(distances_all[i]))
-    axes[i].hist(distances_all[i], len(Counter(distances_all[i])))
-    axes[i].set_title(TITLES[os.path.splitext(filenames[i])[0]])
-    axes[i].set_xlabel("distance to upper bound (# LITTLE cores)")
-    axes[i].set_ylabel("# configurations")
-    axes[i].xaxis.set_tick_params(labelbottom=True)
-    axes[i].yaxis.set_tick_params(labelleft=True)
-plt.subplots_adjust(hspace=0.4)
-plt.subplots_adjust(wspace=0.4)
-#plt.savefig("./results_hist.png",dpi=300)
-plt.savefig("./results_hist.eps",format="eps")
+            df = df.merge(res_df, on=KEY_COLUMNS, how="outer")
+    df[littlecolnames] = df[littlecolnames].fillna(-1).astype(np.int64)
+    df = df.sort_values(KEY_COLUMNS, ignore_index=True)
+    return df, littlecolnames
+
+
+# Returns bounds of the search space for chip of given size (cf. boundindex.py)
+def get_bounds(chipwidth, chipheight):
+    return BoundIndex(chipwidth, chipheight, get_coreinfo(chipwidth, chipheight), KEY_COLUMNS + ["LITTLE"])
+
+
+# Determines upper bound for number of feasible solutions by chip area constraint
+def compute_ub_feas(bounds):
+    return bounds.num_feasible()
+
+
+# Upper bound for number of LITTLE cores by chip area constraint (as given by bounds), per row of data frame df
+def compute_little_ub(df, bounds):
+    return bounds.get_fill_ub(df["big"].to_numpy(), df["A72"].to_numpy(), df["Mali"].to_numpy())
+
+
+# Statistics of the joined results of several solvers (cf. read_results), per solver in the order of littlecolnames,
+# w.r.t. the bounds of the chip (cf. get_bounds)
+# Distances are differences between the upper bound for LITTLE cores and the LITTLE cores placed by a solver
+# - df_feas_exists, df_feas_all: configurations with a feasible solution of at least one or of all solvers (with column LITTLE_ub)
+# - num_feasible, num_exclusive: numbers of feasible solutions, and of those no other solver found
+# - distances_exists: distances for df_feas_exists (-1 where solver found no feasible solution)
+# - distances_all: distances for df_feas_all
+class Statistics:
+    def __init__(self, df, littlecolnames, bounds):
+        self.littlecolnames = littlecolnames
+        littles = df[littlecolnames].to_numpy()
+        feasible = littles != -1
+        exists = feasible.any(axis=1)
+        feasible_all = feasible.all(axis=1)
+        self.num_feasible = np.count_nonzero(feasible, axis=0)
+        self.num_exclusive = np.count_nonzero(feasible[exists] & (np.count_nonzero(feasible[exists], axis=1) == 1)[:, None], axis=0)
+        self.df_feas_exists = df[exists].copy()
+        self.df_feas_exists["LITTLE_ub"] = compute_little_ub(self.df_feas_exists, bounds)
+        self.df_feas_all = df[feasible_all].copy()
+        self.df_feas_all["LITTLE_ub"] = compute_little_ub(self.df_feas_all, bounds)
+        self.distances_exists = np.where(feasible[exists], self.df_feas_exists["LITTLE_ub"].to_numpy()[:, None] - littles[exists], -1)
+        self.distances_all = self.df_feas_all["LITTLE_ub"].to_numpy()[:, None] - littles[feasible_all]
+
+    def max_distance_exists(self, i):
+        return int(self.distances_exists[:, i].max())
+
+    def avg_distance_exists(self, i):
+        distances = self.distances_exists[:, i]
+        return distances[distances >= 0].mean()
+
+    def max_distance_all(self, i):
+        return int(self.distances_all[:, i].max())
+
+    def avg_distance_all(self, i):
+        return self.distances_all[:, i].mean()
+
+    # Number of configurations per distance, for solver i and configurations with a feasible solution of all solvers
+    def distance_counts_all(self, i):
+        return Counter(self.distances_all[:, i].tolist())
+
+
+def print_statistics(statistics, filenames, ub_feas):
+    print("Cases with at least one feasible solution:", len(statistics.df_feas_exists))
+    print("Cases with a feasible solution in all cases:", len(statistics.df_feas_all))
+    print("Number of feasible solutions for...")
+    for i in range(len(filenames)):
+        print("{}: {} ({:4.1f}% of upper bound)".format(get_title(filenames[i]), statistics.num_feasible[i], (statistics.num_feasible[i]/ub_feas)*100))
+    print("Number of exclusive solutions for...")
+    for i in range(len(filenames)):
+        print("{}: {}".format(get_title(filenames[i]), statistics.num_exclusive[i]))
+    print("Distances from upper bound (at least one feasible solution):")
+    for i in range(len(filenames)):
+        print("{}: maximum: {}, average: {:5.2f}".format(os.path.splitext(filenames[i])[0], statistics.max_distance_exists(i), statistics.avg_distance_exists(i)))
+    print("Distances from upper bound (feasible solution for all methods):")
+    for i in range(len(filenames)):
+        print("{}: maximum: {}, average: {:5.2f}".format(os.path.splitext(filenames[i])[0], statistics.max_distance_all(i), statistics.avg_distance_all(i)))
+
+
+# Plots histogram of distances from upper bound for configurations with a feasible solution of all solvers, per solver
+def plot_histograms(statistics, filenames, histogram_file):
+    numrows = 1 # len(filenames) # int(math.ceil(len(filenames) / 2))
+    numcols = len(filenames) # 1 # 2
+
+    fig, axes = plt.subplots(numrows,numcols,sharex=True,sharey=True,figsize=(5*numcols,5*numrows),squeeze=False)
+    axes = axes[0]
+    for i in range(numcols):
+        distance_counts = statistics.distance_counts_all(i)
+        print(statistics.max_distance_all(i))
+        print(distance_counts)
+        axes[i].hist(statistics.distances_all[:, i], len(distance_counts))
+        axes[i].set_title(get_title(filenames[i]))
+        axes[i].set_xlabel("distance to upper bound (# LITTLE cores)")
+        axes[i].set_ylabel("# configurations")
+        axes[i].xaxis.set_tick_params(labelbottom=True)
+        axes[i].yaxis.set_tick_params(labelleft=True)
+    plt.subplots_adjust(hspace=0.4)
+    plt.subplots_adjust(wspace=0.4)
+    #plt.savefig("./results_hist.png",dpi=300)
+    plt.savefig(histogram_file,format=os.path.splitext(histogram_file)[1][1:])
+    plt.close(fig)
+
+
+# Options (all optional):
+# --input PATH: directory of results files (default INPUT_PATH)
+# --filenames FILE: file listing the results files to be compared, one per line (default RESULTS_FILENAME)
+# --chip WxH: chip size, e.g. 32x32 (default CHIPWIDTH x CHIPHEIGHT)
+# --feasible FILE: file to write configurations with a feasible solution of all solvers to (default FEASIBLE_FILE)
+# --plot FILE: file to save histograms to, format as given by its extension (default HISTOGRAM_FILE)
+# --no-plot: skips histograms
+def main():
+    input_path = pop_option(sys.argv, "--input", INPUT_PATH)
+    results_filename = pop_option(sys.argv, "--filenames", RESULTS_FILENAME)
+    chip = pop_option(sys.argv, "--chip")
+    feasible_file = pop_option(sys.argv, "--feasible", FEASIBLE_FILE)
+    histogram_file = pop_option(sys.argv, "--plot", HISTOGRAM_FILE)
+    no_plot = pop_flag(sys.argv, "--no-plot")
+    chipwidth, chipheight = CHIPWIDTH, CHIPHEIGHT
+    if chip is not None:
+        chipwidth, chipheight = parse_chip(chip)
+    bounds = get_bounds(chipwidth, chipheight)
+
+    filenames = read_filenames(results_filename)
+    df, littlecolnames = read_results(input_path, filenames)
+    ub_feas = compute_ub_feas(bounds)
+    print("Upper bound for number of feasible solutions:", ub_feas)
+    statistics = Statistics(df, littlecolnames, bounds)
+    #statistics.df_feas_exists.to_csv("./feasible_solution_exists.csv", columns=KEY_COLUMNS, index=False)
+    statistics.df_feas_all.to_csv(feasible_file, columns=KEY_COLUMNS, index=False)
+    print_statistics(statistics, filenames, ub_feas)
+    if not no_plot:
+        plot_histograms(statistics, filenames, histogram_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,133 @@
 '''
-Groups results of provided input files.
+Groups results of provided input files, i.e. determines the max. number of LITTLE cores over all input files per configuration.
+Results files are merged on the core counts (big, A72, Mali) line by line, so that memory usage does not depend on their size;
+they have to be sorted by core counts, as written by the search space explorations of all solvers.
 '''
 
+
+import os
 import sys
-import pandas as pd
+import heapq
+import itertools
+import contextlib
+from collections import Counter
+import resultparser
+from resultsink import ResultSink
+from sweeputils import pop_option
+
+
+GROUPED_FILE = "./solutions_grouped.csv"
+# Separates names of engines achieving the max. number of LITTLE cores for the same configuration
+ENGINE_SEPARATOR = ";"
+
+
+class UnsortedResultsError(Exception):
+    pass
+
+
+# Name of engine for results file, e.g. solutions_strippacking for ./results_16x16/solutions_strippacking.csv
+def get_engine(filename):
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+# Yields ((big, A72, Mali), #LITTLE) for each line of results file
+# Raises UnsortedResultsError if core counts are out of order (repeated core counts, as after resuming an exploration, are fine)
+def read_results(filename):
+    last_key = None
+    with open(filename, "r") as resf:
+        for line in resf:
+            if not line.strip():
+                continue
+            big, a72, mali, numlittle = [int(field) for field in line.split(",")]
+            key = (big, a72, mali)
+            if last_key is not None and key < last_key:
+                raise UnsortedResultsError("{}: configuration {} listed after {}".format(filename, key, last_key))
+            last_key = key
+            yield key, numlittle
+
+
+# Yields ((big, A72, Mali), index, #LITTLE) for each line of results file, i.e. results tagged with index of results file
+def read_indexed_results(filename, index):
+    for key, numlittle in read_results(filename):
+        yield key, index, numlittle
+
+
+# Merges results files and yields (core counts, #LITTLE per results file) per configuration in order of core counts
+# Configurations missing from a results file count as infeasible (-1) for it; if a results file lists a configuration
+# more than once, the last line counts
+def merge_results(filenames):
+    streams = [read_indexed_results(filename, index) for index, filename in enumerate(filenames)]
+    # Merge is stable, i.e. lines of the same results file keep their order
+    merged = heapq.merge(*streams, key=lambda entry: entry[0])
+    for key, entries in itertools.groupby(merged, key=lambda entry: entry[0]):
+        numlittles = [-1] * len(filenames)
+        for _, index, numlittle in entries:
+            numlittles[index] = numlittle
+        yield key, numlittles
+
+
+# Returns max. number of LITTLE cores and indexes of the results files achieving it (none if all results are infeasible)
+def group(numlittles):
+    maxlittles = max(numlittles)
+    if maxlittles == -1:
+        return maxlittles, []
+    return maxlittles, [index for index, numlittle in enumerate(numlittles) if numlittle == maxlittles]
+
 
+# Options:
+# --output FILE: file to write grouped results to as lines big,A72,Mali,max. #LITTLE (default GROUPED_FILE)
+# --engines FILE: also writes grouped results along with the engines achieving the max. (names of their results files,
+#   separated by ENGINE_SEPARATOR, empty if no engine found a feasible solution) to FILE as lines big,A72,Mali,max. #LITTLE,engines
+# --chip WxH: checks grouped results against the upper bounds for LITTLE cores by chip area constraint of
+#   the given chip size, e.g. 32x32 (cf. boundindex.py)
+# Remaining arguments are the results files to be grouped
+# Prints results exceeding the upper bounds (if --chip is given) as they are found, followed by the number of configurations
+# per engine for which it achieves the max., in total and exclusively
+def main():
+    output_file = pop_option(sys.argv, "--output", GROUPED_FILE)
+    engines_file = pop_option(sys.argv, "--engines")
+    chip = pop_option(sys.argv, "--chip")
+    filenames = sys.argv[1:]
+    if not filenames:
+        print("Please specify results files!")
+        sys.exit(1)
+    engines = [get_engine(filename) for filename in filenames]
+    bounds = None
+    if chip is not None:
+        bounds = resultparser.get_bounds(*resultparser.parse_chip(chip))
 
-res_dfs = []
-littlecolnames = []
-for i in range(1, len(sys.argv)):
-    littlecolname = "LITTLE_" + sys.argv[i]
-    littlecolnames.append(littlecolname)
-    res_dfs.append(pd.read_csv(sys.argv[i], sep=",", names=["big", "A72", "Mali", littlecolname]))
+    num_best = Counter()
+    num_exclusive = Counter()
+    num_exceeding = 0
+    try:
+        with ResultSink(output_file) as sink, ResultSink(engines_file) if engines_file is not None else contextlib.nullcontext() as engines_sink:
+            for key, numlittles in merge_results(filenames):
+                maxlittles, best = group(numlittles)
+                sink.write_result(*key, maxlittles)
+                if engines_sink is not None:
+                    engines_sink.write_fields(*key, maxlittles, ENGINE_SEPARATOR.join(engines[index] for index in best))
+                num_best.update(best)
+                if len(best) == 1:
+                    num_exclusive.update(best)
+                if bounds is not None:
+                    # Configurations beyond the search space of the chip violate the chip area constraint
+                    little_ub = bounds.get_fill_ub(*key) if all(count < size for count, size in zip(key, bounds.shape)) else -1
+                    if maxlittles > little_ub:
+                        # Printed right away, so that memory usage does not depend on the number of such results
+                        if num_exceeding == 0:
+                            print("Results exceeding upper bound for LITTLE cores (big,A72,Mali,max. #LITTLE,upper bound):")
+                        print("{},{},{},{},{}".format(*key, maxlittles, little_ub))
+                        num_exceeding += 1
+    except UnsortedResultsError as error:
+        print("Results file not sorted by core counts! {}".format(error))
+        sys.exit(1)
 
-df = res_dfs[0].copy()
-for i in range(1, len(res_dfs)):
-    littlecol = res_dfs[i].iloc[:,-1:]
-    # ASSUMES IDENTICAL ORDER IN ALL RESULTS FILES!!
-    df = pd.concat([df, littlecol], axis=1)
+    print("Configurations with max. number of LITTLE cores (exclusively) for...")
+    for index, engine in enumerate(engines):
+        print("{}: {} ({})".format(engine, num_best[index], num_exclusive[index]))
+    if num_exceeding > 0:
+        print("Results exceeding upper bound for LITTLE cores:", num_exceeding)
 
-maxlittles = []
-for index, row in df.iterrows():
-    maxlittles.append(max(row[3:]))
-df["maxlittles"] = maxlittles
 
-df.to_csv("./solutions_grouped.csv", columns=["big", "A72", "Mali", "maxlittles"], index=False, header=False)
-#print(df)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+'''
+Buffered writer for the results files of search space explorations (one line i,j,k,#fill cores per configuration).
+'''
+
+
+import os
+import shutil
+import threading
+import queue
+
+
+# Results are written to a partial file first, which replaces the results file once the exploration is complete
+PARTIAL_SUFFIX = ".partial"
+# Number of lines handed to the writer thread at once
+BATCH_SIZE = 256
+
+
+# Returns file to resume an interrupted exploration from, i.e. the partial results file if present
+def get_checkpoint_file(path):
+    if os.path.isfile(path + PARTIAL_SUFFIX):
+        return path + PARTIAL_SUFFIX
+    return path
+
+
+# Collects result lines in batches, which are written to the partial results file by a background thread
+# If resume is set, results are appended to the partial results file (or to a copy of the results file, if there is no
+# partial one), otherwise it is started afresh
+# Use as context manager: if the exploration fails, results written so far are kept in the partial results file
+class ResultSink:
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.partial_path = path + PARTIAL_SUFFIX
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and not os.path.isfile(self.partial_path) and os.path.isfile(path):
+            shutil.copyfile(path, self.partial_path)
+        self.outf = open(self.partial_path, "a" if resume else "w")
+        self.batch = []
+        self.batches = queue.Queue()
+        self.error = None
+        self.writer = threading.Thread(target=self.write_batches, daemon=True)
+        self.writer.start()
+
+    def write_result(self, i, j, k, numct3):
+        self.batch.append("{},{},{},{}\n".format(i,j,k,numct3))
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    # Writes line of comma-separated fields, e.g. for results with further metrics per configuration
+    def write_fields(self, *fields):
+        self.batch.append(",".join(str(field) for field in fields) + "\n")
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    # Hands current batch to writer thread
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        if self.batch:
+            self.batches.put(self.batch)
+            self.batch = []
+
+    def write_batches(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            try:
+                self.outf.write("".join(batch))
+                self.outf.flush()
+            except OSError as error:
+                self.error = error
+                break
+
+    # Writes remaining results; if finalize is set, the partial results file atomically replaces the results file
+    def close(self, finalize=True):
+        self.flush()
+        self.batches.put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+        self.outf.flush()
+        os.fsync(self.outf.fileno())
+        self.outf.close()
+        if finalize:
+            os.replace(self.partial_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(finalize=exc_type is None)
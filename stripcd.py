@@ -4,14 +4,44 @@ Computes max. configurations for chip design via strip packing heuristic as in W
 
 
 import sys
-import os
 import time
+import heapq
+import itertools
+import multiprocessing
+from layoutstore import LayoutWriter
+from resultsink import ResultSink, get_checkpoint_file
+from nonproximity import NonproximityWriter
+from instrumentation import Instrumentation, timed_phase
+from sweeputils import pop_option, pop_flag, SweepPruner, sweep_cells, load_checkpoint
+from boundindex import BoundIndex
 
 
 CHIPWIDTH = None # 2400 # 3200 # 2400
 CHIPHEIGHT = None # 2400 # 3200 # 2400
 CORE_ORDER = ["big", "A72", "Mali", "LITTLE"]
-EQ_THRESHOLD = 0.001
+# Results and layouts explored are saved to a results file and a layout store (cf. layoutstore.py)
+# Suffix LIST_ORDER_SUFFIX distinguishes explorations placing cores in list order (option --list-order)
+SOLUTIONS_FILE = "/tmp/solutions_strippacking{}.csv"
+LAYOUT_STORE = "/tmp/layouts_strippacking{}"
+LIST_ORDER_SUFFIX = "_listorder"
+PORTFOLIO_SUFFIX = "_portfolio"
+# Rules for choosing among cores of equal fitness tried in portfolio mode (option --portfolio), the default rule first:
+# first in core list, or largest/smallest core area
+# Segments are always chosen bottom-left (as in Wei et al.): choosing the widest or narrowest lowest segment instead
+# never yielded more fill cores on 16x16 or 24x24 chips
+PORTFOLIO = ["first", "largest", "smallest"]
+# Time (in seconds) per configuration after which no further rules of the portfolio are tried
+PORTFOLIO_BUDGET = 1.0
+WORKER_CHUNKSIZE = 16
+# Functions accounted to phases if instrumentation is enabled (option --instrument)
+INSTRUMENTED_PHASES = {
+    "choose_segment": "segment selection",
+    "choose_core": "segment selection",
+    "place_core": "placement",
+    "remove_segment": "skyline",
+    "get_actual_chip_height": "skyline"
+}
+INSTRUMENTATION = None
 
 
 class Core:
@@ -22,13 +52,111 @@ class Core:
         self.maxcols = int(CHIPWIDTH // width)
 
 
+# Coordinates and widths are integers (as are chip and core sizes), so they can be compared exactly
+# Heights of the vertical edges to the left (lh) and right (rh) are infinite at the chip boundaries
 class Segment:
+    __slots__ = ("x", "y", "w", "lh", "rh", "prev", "next", "removed")
+
     def __init__(self, x, y, w, lh, rh):
         self.x = x
         self.y = y
         self.w = w
         self.lh = lh
         self.rh = rh
+        self.prev = None
+        self.next = None
+        self.removed = False
+
+
+# Segments of the skyline from left to right as a doubly linked list
+# The lowest (leftmost) segment is looked up via a heap with lazy deletion: entries of segments that have been removed,
+# raised or moved since are discarded when they reach the top. The height of the skyline is kept track of, as segments
+# are only ever raised, and only the lowest segment is ever removed.
+class Skyline:
+    def __init__(self, chipwidth):
+        self.first = Segment(0,0,chipwidth,float('inf'),float('inf'))
+        self.last = self.first
+        self.length = 1
+        self.height = 0
+        self.heap = []
+        self.counter = itertools.count()
+        self.update(self.first)
+
+    def __iter__(self):
+        segment = self.first
+        while segment is not None:
+            yield segment
+            segment = segment.next
+
+    def __len__(self):
+        return self.length
+
+    # Has to be called whenever a segment has been added, raised or moved
+    def update(self, segment):
+        heapq.heappush(self.heap, (segment.y, segment.x, next(self.counter), segment))
+        if segment.y > self.height:
+            self.height = segment.y
+
+    # Copies segments, the heap is rebuilt from current segments only
+    def copy(self):
+        skyline = Skyline.__new__(Skyline)
+        skyline.first = None
+        skyline.last = None
+        skyline.length = 0
+        skyline.height = self.height
+        skyline.heap = []
+        skyline.counter = itertools.count()
+        for segment in self:
+            newseg = Segment(segment.x, segment.y, segment.w, segment.lh, segment.rh)
+            if skyline.last is None:
+                skyline.first = newseg
+                skyline.last = newseg
+                skyline.length = 1
+                skyline.update(newseg)
+            else:
+                skyline.insert_after(skyline.last, newseg)
+        return skyline
+
+    def lowest(self):
+        while True:
+            y, x, _, segment = self.heap[0]
+            if not segment.removed and segment.y == y and segment.x == x:
+                return segment
+            heapq.heappop(self.heap)
+
+    def insert_before(self, segment, newseg):
+        newseg.prev = segment.prev
+        newseg.next = segment
+        if segment.prev is None:
+            self.first = newseg
+        else:
+            segment.prev.next = newseg
+        segment.prev = newseg
+        self.length += 1
+        self.update(newseg)
+
+    def insert_after(self, segment, newseg):
+        newseg.prev = segment
+        newseg.next = segment.next
+        if segment.next is None:
+            self.last = newseg
+        else:
+            segment.next.prev = newseg
+        segment.next = newseg
+        self.length += 1
+        self.update(newseg)
+
+    def unlink(self, segment):
+        if segment.prev is None:
+            self.first = segment.next
+        else:
+            segment.prev.next = segment.next
+        if segment.next is None:
+            self.last = segment.prev
+        else:
+            segment.next.prev = segment.prev
+        segment.removed = True
+        self.length -= 1
 
 
 COREINFO = None
@@ -52,34 +180,28 @@ def set_coreinfo():
 
 # Choose leftmost bottom segment
 def choose_segment(skyline):
-    segind = 0
-    segheight = float('inf')
-    for i in range(len(skyline)):
-        if skyline[i].y < segheight:
-            segheight = skyline[i].y
-            segind = i
-    return segind
+    return skyline.lowest()
 
 
-def remove_segment(skyline, segind):
+def remove_segment(skyline, segment):
     if len(skyline) == 1:
         raise ValueError("Skyline contains only a single segment, cannot remove last remaining segment!")
-    segment = skyline[segind]
-    if segind == 0:
+    if segment.prev is None:
         # Segment is leftmost segment
-        rightseg = skyline[segind+1]
+        rightseg = segment.next
         rightseg.w = rightseg.w + segment.w
         rightseg.lh = float('inf')
-        rightseg.x = 0.0
-    elif segind == len(skyline) - 1:
+        rightseg.x = 0
+        skyline.update(rightseg)
+    elif segment.next is None:
         # Segment is rightmost segment
-        leftseg = skyline[segind-1]
+        leftseg = segment.prev
         leftseg.w = leftseg.w + segment.w
         leftseg.rh = float('inf')
     else:
         # Segment ist somewhere inbetween
-        leftseg = skyline[segind-1]
-        rightseg = skyline[segind+1]
+        leftseg = segment.prev
+        rightseg = segment.next
         if segment.lh < segment.rh:
             # Level on left hand side
             leftseg.w = leftseg.w + segment.w
@@ -89,48 +211,41 @@ def remove_segment(skyline, segind):
             rightseg.w = rightseg.w + segment.w
             rightseg.lh = abs(leftseg.y - rightseg.y)
             rightseg.x = segment.x
-    skyline.pop(segind)
+            skyline.update(rightseg)
+    skyline.unlink(segment)
 
 
-def insert_segment(skyline, index, left, x, y, w):
-    #print("Skyline length:", len(skyline))
-    #print("Index:", index)
+def insert_segment(skyline, segment, left, x, y, w):
     if left:
         # Insert to the left of current segment
-        if index == 0:
+        if segment.prev is None:
             # Insert as first segment
             lh = float('inf')
-            rh = abs(skyline[0].y - y)
-            skyline[0].lh = rh
-            skyline[0].w -= w
-            skyline[0].x += w
-            inspos = 0
+            rh = abs(segment.y - y)
+            segment.lh = rh
         else:
-            lh = abs(skyline[index-1].y - y)
-            rh = abs(skyline[index].y - y)
-            skyline[index-1].rh = lh
-            skyline[index].lh = rh
-            skyline[index].w -= w
-            skyline[index].x += w
-            inspos = index
+            lh = abs(segment.prev.y - y)
+            rh = abs(segment.y - y)
+            segment.prev.rh = lh
+            segment.lh = rh
+        segment.w -= w
+        segment.x += w
+        skyline.update(segment)
+        skyline.insert_before(segment, Segment(x, y, w, lh, rh))
     else:
         # Insert to the right of current segment
-        if index == len(skyline)-1:
+        if segment.next is None:
             # Insert as last segment
             rh = float('inf')
-            lh = abs(skyline[-1].y - y)
-            skyline[-1].rh = lh
-            skyline[-1].w -= w
-            inspos = len(skyline)
+            lh = abs(segment.y - y)
+            segment.rh = lh
         else:
-            lh = abs(skyline[index].y - y)
-            rh = abs(skyline[index+1].y - y)
-            skyline[index+1].lh = rh
-            skyline[index].rh = lh
-            skyline[index].w -= w
-            inspos = index+1
-    newseg = Segment(x, y, w, lh, rh)
-    skyline.insert(inspos, newseg)
+            lh = abs(segment.y - y)
+            rh = abs(segment.next.y - y)
+            segment.next.lh = rh
+            segment.rh = lh
+        segment.w -= w
+        skyline.insert_after(segment, Segment(x, y, w, lh, rh))
     
 
 def print_skyline(skyline):
@@ -139,12 +254,6 @@ def print_skyline(skyline):
         print("{} --> {} at height {}, lh: {}, rh:{}".format(segment.x, segment.x+segment.w, segment.y, segment.lh, segment.rh))
 
 
-def is_equal(val1, val2):
-    if abs(val1 - val2) < EQ_THRESHOLD:
-        return True
-    return False
-
-
 # Computes how well each core fits a given segment
 # Possible fitness values are:
 # -1, if core's width is greater than segment's width
@@ -158,11 +267,11 @@ def get_fitness_value(segment, coretype):
         fitness_value = -1
     else:
         fitness_value = 0
-        if is_equal(lh, COREINFO[coretype].height):
+        if lh == COREINFO[coretype].height:
             fitness_value += 1
-        if is_equal(rh, COREINFO[coretype].height):
+        if rh == COREINFO[coretype].height:
             fitness_value += 1
-        if is_equal(w, COREINFO[coretype].width):
+        if w == COREINFO[coretype].width:
             fitness_value += 1
     return fitness_value
 
@@ -175,87 +284,86 @@ def get_fitness_values(segment, corelist):
     return fitness_values
 
 
-def place_core(skyline, segind, width, height, coresx, coresy, coresw, coresh):
-    segment = skyline[segind]
-    #print(segind, segment.lh, segment.rh)
+def place_core(skyline, segment, width, height, coresx, coresy, coresw, coresh):
+    #print(segment.lh, segment.rh)
     if width > segment.w:
         # Core does not fit segment
         # Should not happen, as this has been checked beforehand
         #print("Segment to small, removing segment...")
-        remove_segment(skyline, segind)
+        remove_segment(skyline, segment)
         return 0
     coresw.append(width)
     coresh.append(height)
-    if is_equal(width, segment.w):
+    if width == segment.w:
         # Core fits segment exactly, check for skyline adjustments
         #print("Core fits segment exactly, updating skyline...")
-        coresx.append(segment.x)
-        coresy.append(segment.y)
+        coresx.append(float(segment.x))
+        coresy.append(float(segment.y))
         segment.y += height
+        skyline.update(segment)
         if height == segment.rh:
             # Cannibalize segment to the right
             #print("Cannibalize segment to the right")
-            segment.w += skyline[segind+1].w
-            segment.rh = skyline[segind+1].rh
-            skyline.pop(segind+1)
-        elif segind < len(skyline)-1:
+            segment.w += segment.next.w
+            segment.rh = segment.next.rh
+            skyline.unlink(segment.next)
+        elif segment.next is not None:
             # If not rightmost segment, update vertical segments
-            segment.rh = abs(skyline[segind+1].y - segment.y)
-            skyline[segind+1].lh = segment.rh
+            segment.rh = abs(segment.next.y - segment.y)
+            segment.next.lh = segment.rh
         if height == segment.lh:
             # Merge with segment to the left
             #print("Merge with segment to the left")
-            skyline[segind-1].w += segment.w
-            skyline[segind-1].rh = segment.rh
-            skyline.pop(segind)
-        elif segind > 0:
+            segment.prev.w += segment.w
+            segment.prev.rh = segment.rh
+            skyline.unlink(segment)
+        elif segment.prev is not None:
             # If not leftmost segment, update vertical segments
-            segment.lh = abs(skyline[segind-1].y - segment.y)
-            skyline[segind-1].rh = segment.lh
-    elif is_equal(height, segment.lh):
+            segment.lh = abs(segment.prev.y - segment.y)
+            segment.prev.rh = segment.lh
+    elif height == segment.lh:
         #print("Core fits exactly to the left, updating skyline...")
         # Core fits in exactly at the left hand side
-        coresx.append(segment.x)
-        coresy.append(segment.y)
+        coresx.append(float(segment.x))
+        coresy.append(float(segment.y))
         # Update skyline
         segment.x += width
         segment.w -= width
-        skyline[segind-1].w += width
-    elif is_equal(height, segment.rh):
+        skyline.update(segment)
+        segment.prev.w += width
+    elif height == segment.rh:
         # Core fits in exactly at the right hand side
         #print("Core fits exactly to the right, updating skyline...")
-        coresx.append(segment.x + segment.w - width)
-        coresy.append(segment.y)
+        coresx.append(float(segment.x + segment.w - width))
+        coresy.append(float(segment.y))
         # Update skyline
         segment.w -= width
-        skyline[segind+1].x -= width
-        skyline[segind+1].w += width
+        segment.next.x -= width
+        segment.next.w += width
+        skyline.update(segment.next)
     elif abs(height - segment.lh) <= abs(height - segment.rh):
         #print("Better fit to the left, inserting segment...")
         # Better fit at left hand side of segment
-        coresx.append(segment.x)
-        coresy.append(segment.y)
-        insert_segment(skyline, segind, True, segment.x, segment.y + height, width)
+        coresx.append(float(segment.x))
+        coresy.append(float(segment.y))
+        insert_segment(skyline, segment, True, segment.x, segment.y + height, width)
     else:
         # Place at right hand side of segment
         #print("Better fit to the right, inserting segment...")
-        coresx.append(segment.x + segment.w - width)
-        coresy.append(segment.y)
-        insert_segment(skyline, segind, False, segment.x + segment.w - width, segment.y + height, width)
+        coresx.append(float(segment.x + segment.w - width))
+        coresy.append(float(segment.y))
+        insert_segment(skyline, segment, False, segment.x + segment.w - width, segment.y + height, width)
     #print("Core placed at ({},{})".format(coresx[-1], coresy[-1]))
     #print_skyline(skyline)
     return 1
 
 
 def get_actual_chip_height(skyline):
-    actual_height = 0.0
-    for segment in skyline:
-        if segment.y > actual_height:
-            actual_height = segment.y
-    return actual_height
+    return skyline.height
 
 
-def choose_core(segment, corelist):
+# Among cores of equal fitness, the first one in corelist is chosen, unless tie_break is "largest" or "smallest"
+def choose_core(segment, corelist, tie_break="first"):
     fitness_values = get_fitness_values(segment, corelist)
     best_fitness = -2
     best_core_index = None
@@ -263,25 +371,27 @@ def choose_core(segment, corelist):
         if fitness_values[i] > best_fitness:
             best_fitness = fitness_values[i]
             best_core_index = i
+        elif tie_break != "first" and fitness_values[i] == best_fitness and is_preferred(corelist[i], corelist[best_core_index], tie_break):
+            best_core_index = i
     return best_core_index, best_fitness
 
 
-# Places cores on chip
-# fillwith: core type whose number is maximized after cores of other types have been placed in given number
-# fitness_guided: core selection can either be determined by fitness or by list order
-def place_cores(skyline, corelist, fillwith, fitness_guided):
-    coresx = []
-    coresy = []
-    coresw = []
-    coresh = []
-    corest = []
-    cores_placed = dict.fromkeys(set(corelist), 0)
-    chip_full = False
-    while corelist:
-        segind = choose_segment(skyline)
-        segment = skyline[segind]
+def is_preferred(coretype, othertype, tie_break):
+    area = COREINFO[coretype].width * COREINFO[coretype].height
+    otherarea = COREINFO[othertype].width * COREINFO[othertype].height
+    if tie_break == "largest":
+        return area > otherarea
+    return area < otherarea
+
+
+# Places next core of corelist, chosen by fitness or by list order, on the leftmost bottom segment it fits into
+# Segments too small are removed from the skyline
+# Returns whether chip height is exceeded by the placement
+def place_next_core(skyline, corelist, fitness_guided, cores_placed, coresx, coresy, coresw, coresh, corest, tie_break="first"):
+    while True:
+        segment = choose_segment(skyline)
         if fitness_guided:
-            best_core_index, best_fitness = choose_core(segment, corelist)
+            best_core_index, best_fitness = choose_core(segment, corelist, tie_break)
         else:
             best_core_index = 0
             best_fitness = get_fitness_value(segment, corelist[0])
@@ -291,56 +401,196 @@ def place_cores(skyline, corelist, fillwith, fitness_guided):
         if best_fitness < 0:
             # Core's width is greater than segment's width
             #print("Segment to small, removing segment...")
-            remove_segment(skyline, segind)
+            remove_segment(skyline, segment)
         else:
-            core_placed = place_core(skyline, segind, COREINFO[coretype].width, COREINFO[coretype].height, coresx, coresy, coresw, coresh)
+            core_placed = place_core(skyline, segment, COREINFO[coretype].width, COREINFO[coretype].height, coresx, coresy, coresw, coresh)
             #print("Core placed:", core_placed)
             if core_placed:
                 # All good, commit placement
                 cores_placed[coretype] += 1
                 corest.append(coretype)
                 corelist.pop(best_core_index)
+                break
             else:
                 # Should not happen
                 raise ValueError("Core placement return value error! Core submitted for placement could not be placed!")
-        # Check for chip area usage
-        if get_actual_chip_height(skyline) > CHIPHEIGHT:
-            chip_full = True
-            break
-    if not chip_full:
-        # Now fill remaining chip area with cores of specified type
-        #print("Filling chip with cores of type", fillwith)
-        cores_placed[fillwith] = 0
-        while get_actual_chip_height(skyline) <= CHIPHEIGHT:
-            #print("Attempting to place core of type", fillwith)
-            segind = choose_segment(skyline)
-            segment = skyline[segind]
-            # Check whether core fits segment
-            fitness = get_fitness_value(segment, fillwith)
-            if fitness < 0:
-                #print("Segment to small, removing segment...")
-                remove_segment(skyline, segind)
+    # Check for chip area usage (removing segments does not change it)
+    return get_actual_chip_height(skyline) > CHIPHEIGHT
+
+
+# Fills remaining chip area with cores of type fillwith until chip height is exceeded
+def fill_chip(skyline, fillwith, cores_placed, coresx, coresy, coresw, coresh, corest):
+    #print("Filling chip with cores of type", fillwith)
+    cores_placed[fillwith] = 0
+    while get_actual_chip_height(skyline) <= CHIPHEIGHT:
+        #print("Attempting to place core of type", fillwith)
+        segment = choose_segment(skyline)
+        # Check whether core fits segment
+        fitness = get_fitness_value(segment, fillwith)
+        if fitness < 0:
+            #print("Segment to small, removing segment...")
+            remove_segment(skyline, segment)
+        else:
+            core_placed = place_core(skyline, segment, COREINFO[fillwith].width, COREINFO[fillwith].height, coresx, coresy, coresw, coresh)
+            if core_placed:
+                # All good, commit placement
+                cores_placed[fillwith] += 1
+                corest.append(fillwith)
             else:
-                core_placed = place_core(skyline, segind, COREINFO[fillwith].width, COREINFO[fillwith].height, coresx, coresy, coresw, coresh)
-                if core_placed:
-                    # All good, commit placement
-                    cores_placed[fillwith] += 1
-                    corest.append(fillwith)
-                else:
-                    # Should not happen
-                    raise ValueError("Core placement return value error! Core submitted for placement could not be placed!")
-    #else:
-        #print("Chip area depleted by cores specified in list, fill type cannot be placed!")
-    # Revert last placement
+                # Should not happen
+                raise ValueError("Core placement return value error! Core submitted for placement could not be placed!")
+
+
+# Reverts last placement, i.e. the one exceeding chip height
+def revert_last_placement(cores_placed, coresx, coresy, coresw, coresh, corest):
     coresx.pop()
     coresy.pop()
     coresw.pop()
     coresh.pop()
     lasttype = corest.pop()
     cores_placed[lasttype] -= 1
+
+
+# Places cores on chip
+# fillwith: core type whose number is maximized after cores of other types have been placed in given number
+# fitness_guided: core selection can either be determined by fitness or by list order
+# tie_break: rule for choosing among cores of equal fitness (cf. choose_core)
+def place_cores(skyline, corelist, fillwith, fitness_guided, tie_break="first"):
+    coresx = []
+    coresy = []
+    coresw = []
+    coresh = []
+    corest = []
+    cores_placed = dict.fromkeys(set(corelist), 0)
+    chip_full = False
+    while corelist and not chip_full:
+        chip_full = place_next_core(skyline, corelist, fitness_guided, cores_placed, coresx, coresy, coresw, coresh, corest, tie_break)
+    if not chip_full:
+        # Now fill remaining chip area with cores of specified type
+        fill_chip(skyline, fillwith, cores_placed, coresx, coresy, coresw, coresh, corest)
+    #else:
+        #print("Chip area depleted by cores specified in list, fill type cannot be placed!")
+    revert_last_placement(cores_placed, coresx, coresy, coresw, coresh, corest)
     return cores_placed, coresx, coresy, coresw, coresh, corest, chip_full
 
 
+# Cores of the first three core types in CORE_ORDER placed in list order (i.e. not fitness-guided), before filling the chip
+# If cores are placed in list order, the placements for configuration (i,j,k+1) are those for (i,j,k) followed by
+# the placement of one more core of the third type (likewise for (i,j+1,0) and (i+1,0,0)), so partial packings can be
+# extended and copied instead of packing each configuration from scratch
+class PartialPacking:
+    def __init__(self, chipwidth):
+        self.skyline = Skyline(chipwidth)
+        self.coresx = []
+        self.coresy = []
+        self.coresw = []
+        self.coresh = []
+        self.corest = []
+        self.cores_placed = dict.fromkeys(CORE_ORDER[:-1], 0)
+        self.chip_full = False
+
+    def copy(self):
+        packing = PartialPacking.__new__(PartialPacking)
+        packing.skyline = self.skyline.copy()
+        packing.coresx = self.coresx.copy()
+        packing.coresy = self.coresy.copy()
+        packing.coresw = self.coresw.copy()
+        packing.coresh = self.coresh.copy()
+        packing.corest = self.corest.copy()
+        packing.cores_placed = self.cores_placed.copy()
+        packing.chip_full = self.chip_full
+        return packing
+
+    # Once the chip is full, configurations with further cores are infeasible, so no more cores are placed
+    def place(self, coretype):
+        if not self.chip_full:
+            self.chip_full = place_next_core(self.skyline, [coretype], False, self.cores_placed, self.coresx, self.coresy, self.coresw, self.coresh, self.corest)
+
+    # Fills chip, returns same results as place_cores (the partial packing is used up)
+    def finish(self, fillwith):
+        if not self.chip_full:
+            fill_chip(self.skyline, fillwith, self.cores_placed, self.coresx, self.coresy, self.coresw, self.coresh, self.corest)
+        revert_last_placement(self.cores_placed, self.coresx, self.coresy, self.coresw, self.coresh, self.corest)
+        return self.cores_placed, self.coresx, self.coresy, self.coresw, self.coresh, self.corest, self.chip_full
+
+
+# Yields each configuration (i,j,k) in sweep order along with partial packing of its cores placed in list order
+# Each partial packing extends the one of a previous configuration by a single core; it must not be modified (cf. explore_prefix)
+def list_order_prefixes(maxct0, maxct1, maxct2):
+    prefix_i = PartialPacking(CHIPWIDTH)
+    for i in range(maxct0+1):
+        if i > 0:
+            prefix_i.place(CORE_ORDER[0])
+        prefix_ij = prefix_i.copy()
+        for j in range(maxct1+1):
+            if j > 0:
+                prefix_ij.place(CORE_ORDER[1])
+            prefix = prefix_ij.copy()
+            for k in range(maxct2+1):
+                if k > 0:
+                    prefix.place(CORE_ORDER[2])
+                yield (i, j, k), prefix
+
+
+# Fills chip starting from a copy of given partial packing, with results as explore_cell
+def explore_prefix(prefix):
+    fillwith = CORE_ORDER[-1]
+    cores_placed, coresx, coresy, coresw, coresh, corest, is_infeasible = prefix.copy().finish(fillwith)
+    if is_infeasible:
+        return -1, None
+    return corest.count(fillwith), (coresx, coresy, coresw, coresh, corest)
+
+
+# Packs cores for core counts (i,j,k) of the first three core types in CORE_ORDER and fills chip with cores of the fourth
+# Returns number of fill cores and layout (coresx, coresy, coresw, coresh, corest), or -1 and None if infeasible
+def explore_cell(i, j, k, fitness_guided=True, tie_break="first"):
+    # Construct corelist
+    #print("Investigating core counts ({},{},{})".format(i,j,k))
+    corelist = []
+    for l in range(len(CORE_ORDER)-1):
+        core = CORE_ORDER[l]
+        if l == 0:
+            numcores = i
+        elif l == 1:
+            numcores = j
+        elif l == 2:
+            numcores = k
+        cores_added = [core] * numcores
+        corelist += cores_added
+    fillwith = CORE_ORDER[-1]
+    # Initialize skyline
+    skyline = Skyline(CHIPWIDTH)
+    # Commence strip packing heuristic
+    cores_placed, coresx, coresy, coresw, coresh, corest, is_infeasible = place_cores(skyline, corelist, fillwith, fitness_guided, tie_break)
+    if is_infeasible:
+        return -1, None
+    return corest.count(fillwith), (coresx, coresy, coresw, coresh, corest)
+
+
+# Worker process entry point for portfolio mode
+# Tries rules of the portfolio in turn, until all have been tried or the time budget is used up (the default rule is
+# always tried), and returns results for the rule yielding the most fill cores (the earliest one among equally good rules)
+def explore_cell_portfolio(cell):
+    i, j, k, budget = cell
+    start_time = time.perf_counter()
+    best_numct3, best_layout, best_rule = -1, None, 0
+    for rule in range(len(PORTFOLIO)):
+        if rule > 0 and time.perf_counter() - start_time > budget:
+            break
+        numct3, layout = explore_cell(i, j, k, True, PORTFOLIO[rule])
+        if numct3 > best_numct3:
+            best_numct3, best_layout, best_rule = numct3, layout, rule
+    return best_numct3, best_layout, best_rule
+
+
+def init_worker(chipwidth, chipheight):
+    global CHIPWIDTH
+    CHIPWIDTH = chipwidth
+    global CHIPHEIGHT
+    CHIPHEIGHT = chipheight
+    set_coreinfo()
+
+
 def read_input(input_file):
     corelist = []
     with open(input_file, 'r') as inpf:
@@ -366,70 +616,142 @@ def read_input(input_file):
 # C4,4
 # 
 # If no arguments are passed, the search space is systematically explored
+# Configurations violating the chip area constraint (cf. boundindex.py) are skipped (i.e., reported as infeasible) without packing
+# Option --prune-dominated also skips configurations with a component-wise smaller infeasible configuration
+# (the heuristic is not monotone in the core counts, so results may differ)
+# Option --resume continues an interrupted exploration, skipping all configurations already listed in the results file (or its partial file)
+# Option --instrument FILE appends time spent per phase, wall time and peak memory for the run and each explored
+# configuration to FILE as JSON lines
+# Option --list-order places cores in list order rather than guided by fitness; explorations then extend the partial
+# packing of the previous configuration by one core instead of packing from scratch, and results are saved with
+# suffix LIST_ORDER_SUFFIX
+# Option --portfolio tries all tie-break rules in PORTFOLIO for each configuration (within
+# a time budget of PORTFOLIO_BUDGET seconds per configuration, or as given by option --budget SECONDS) and keeps the
+# layout with the most fill cores; configurations are distributed across worker processes (as many as CPUs, or as given by
+# option --workers N), and results are saved with suffix PORTFOLIO_SUFFIX (option --prune-dominated is ignored)
+# Options --results FILE and --layouts PATH save results and layouts to FILE and the layout store at PATH instead of
+# SOLUTIONS_FILE and LAYOUT_STORE
+# Option --nonproximity FILE also computes nonproximity per core type of each layout right after exploring its
+# configuration, and writes it to FILE (cf. NonproximityWriter in nonproximity.py)
+# Results of explorations are written to a partial file (cf. resultsink.py), replacing the results file once complete
 def main():
+    prune_dominated = pop_flag(sys.argv, "--prune-dominated")
+    resume = pop_flag(sys.argv, "--resume")
+    instrument_file = pop_option(sys.argv, "--instrument")
+    results_path = pop_option(sys.argv, "--results")
+    layouts_path = pop_option(sys.argv, "--layouts")
+    nonproximity_file = pop_option(sys.argv, "--nonproximity")
+    list_order = pop_flag(sys.argv, "--list-order")
+    portfolio = pop_flag(sys.argv, "--portfolio")
+    workers = pop_option(sys.argv, "--workers")
+    if workers is not None:
+        workers = int(workers)
+    budget = float(pop_option(sys.argv, "--budget", PORTFOLIO_BUDGET))
+    if list_order and portfolio:
+        print("Options --list-order and --portfolio cannot be combined!")
+        sys.exit(1)
+    suffix = LIST_ORDER_SUFFIX if list_order else PORTFOLIO_SUFFIX if portfolio else ""
     output_file = sys.argv[1]
     global CHIPWIDTH
     CHIPWIDTH = int(sys.argv[2]) * 100
     global CHIPHEIGHT
     CHIPHEIGHT = int(sys.argv[3]) * 100
     set_coreinfo()
+    global INSTRUMENTATION
+    if instrument_file is not None:
+        INSTRUMENTATION = Instrumentation(instrument_file, {"engine": "stripcd", "variant": "listorder" if list_order else "portfolio" if portfolio else "fitness", "chip": "{}x{}".format(sys.argv[2], sys.argv[3])})
+        INSTRUMENTATION.instrument(globals(), INSTRUMENTED_PHASES)
     if len(sys.argv) >= 5:
         input_file = sys.argv[4]
         corelist, fillwith = read_input(input_file)
         # Initialize skyline
-        initial_segment = Segment(0.0,0.0,CHIPWIDTH,float('inf'),float('inf'))
-        skyline = [initial_segment]
+        skyline = Skyline(CHIPWIDTH)
         
         # Commence strip packing heuristic
-        cores_placed, coresx, coresy, coresw, coresh, corest, is_infeasible = place_cores(skyline, corelist, fillwith, True)
+        cores_placed, coresx, coresy, coresw, coresh, corest, is_infeasible = place_cores(skyline, corelist, fillwith, not list_order)
         print("Total cores placed:")
         for key, val in cores_placed.items():
             print("{}: {}".format(key, val))
-        with open(output_file, "w") as cdf:
-            for i in range(len(corest)):
-                cdf.write("{},{},{},{},{}\n".format(coresx[i], coresy[i], coresw[i], coresh[i], corest[i]))
+        with timed_phase(INSTRUMENTATION, "file I/O"):
+            with open(output_file, "w") as cdf:
+                for i in range(len(corest)):
+                    cdf.write("{},{},{},{},{}\n".format(coresx[i], coresy[i], coresw[i], coresh[i], corest[i]))
     elif len(sys.argv) == 4:
         # Explore search space
         maxct0 = COREINFO[CORE_ORDER[0]].maxrows * COREINFO[CORE_ORDER[0]].maxcols
         maxct1 = COREINFO[CORE_ORDER[1]].maxrows * COREINFO[CORE_ORDER[1]].maxcols
         maxct2 = COREINFO[CORE_ORDER[2]].maxrows * COREINFO[CORE_ORDER[2]].maxcols
-
-        for i in range(maxct0+1):
-            for j in range(maxct1+1):
-                for k in range(maxct2+1):
-                    # Construct corelist
-                    #print("Investigating core counts ({},{},{}), max. ({},{},{})".format(i,j,k,maxct0,maxct1,maxct2))
-                    corelist = []
-                    for l in range(len(CORE_ORDER)-1):
-                        core = CORE_ORDER[l]
-                        if l == 0:
-                            numcores = i
-                        elif l == 1:
-                            numcores = j
-                        elif l == 2:
-                            numcores = k
-                        cores_added = [core] * numcores
-                        corelist += cores_added
-                    fillwith = CORE_ORDER[-1]
-                    # Initialize skyline
-                    initial_segment = Segment(0.0,0.0,CHIPWIDTH,float('inf'),float('inf'))
-                    skyline = [initial_segment]
-                    # Commence strip packing heuristic
-                    cores_placed, coresx, coresy, coresw, coresh, corest, is_infeasible = place_cores(skyline, corelist, fillwith, True)
-                    if not is_infeasible:
-                        numct3 = corest.count(CORE_ORDER[-1])
-                        if not os.path.isdir("/tmp/layouts_strippacking"):
-                            os.mkdir("/tmp/layouts_strippacking")
-                        with open("/tmp/layouts_strippacking/layout_{}_{}_{}.csv".format(i, j, k), "w") as cdf:
-                            for m in range(len(corest)):
-                                cdf.write("{},{},{},{},{}\n".format(coresx[m], coresy[m], coresw[m], coresh[m], corest[m]))
+        bounds = BoundIndex(CHIPWIDTH, CHIPHEIGHT, COREINFO, CORE_ORDER)
+
+        results_file = results_path if results_path is not None else SOLUTIONS_FILE.format(suffix)
+        layout_store = layouts_path if layouts_path is not None else LAYOUT_STORE.format(suffix)
+        completed = {}
+        if resume:
+            completed = load_checkpoint(get_checkpoint_file(results_file), sweep_cells(maxct0, maxct1, maxct2), layout_store, CORE_ORDER[-1])
+        with LayoutWriter(layout_store, resume) as layouts, ResultSink(results_file, resume) as sink, NonproximityWriter(nonproximity_file) as metrics:
+            metrics.write_completed(completed, layout_store)
+            if portfolio:
+                # Results are collected (and written) in sweep order, only cells satisfying the chip area constraint are submitted
+                cells = [cell for cell in sweep_cells(maxct0, maxct1, maxct2) if cell not in completed]
+                tasks = [cell + (budget,) for cell in cells if bounds.is_area_feasible(*cell)]
+                rules_chosen = [0] * len(PORTFOLIO)
+                with multiprocessing.Pool(workers, initializer=init_worker, initargs=(CHIPWIDTH, CHIPHEIGHT)) as pool:
+                    results = zip(tasks, pool.imap(explore_cell_portfolio, tasks, chunksize=WORKER_CHUNKSIZE))
+                    task, (numct3, layout, rule) = next(results, (None, (-1, None, 0)))
+                    for cell in cells:
+                        i, j, k = cell
+                        if task is not None and cell == task[:3]:
+                            if layout is not None:
+                                layouts.write_layout(i, j, k, *layout)
+                                rules_chosen[rule] += 1
+                            sink.write_result(i, j, k, numct3)
+                            metrics.write(i, j, k, numct3, layout)
+                            task, (numct3, layout, rule) = next(results, (None, (-1, None, 0)))
+                        else:
+                            sink.write_result(i, j, k, -1)
+                            metrics.write(i, j, k, -1)
+                print("Configurations per rule chosen:")
+                for rule in range(len(PORTFOLIO)):
+                    print("{}: {}".format(PORTFOLIO[rule], rules_chosen[rule]))
+            else:
+                pruner = SweepPruner(bounds, prune_dominated)
+                if list_order:
+                    cells = list_order_prefixes(maxct0, maxct1, maxct2)
+                else:
+                    cells = ((cell, None) for cell in sweep_cells(maxct0, maxct1, maxct2))
+                for (i, j, k), prefix in cells:
+                    if (i, j, k) in completed:
+                        pruner.record(i, j, k, completed[(i, j, k)])
+                        continue
+                    if INSTRUMENTATION is not None:
+                        INSTRUMENTATION.begin_cell()
+                    if pruner.skip(i, j, k):
+                        pruner.record(i, j, k, -1)
+                        with timed_phase(INSTRUMENTATION, "file I/O"):
+                            sink.write_result(i, j, k, -1)
+                            metrics.write(i, j, k, -1)
+                        if INSTRUMENTATION is not None:
+                            INSTRUMENTATION.end_cell(i, j, k, -1, skipped=True)
+                        continue
+                    if list_order:
+                        numct3, layout = explore_prefix(prefix)
                     else:
-                        numct3 = -1
-                    with open("/tmp/solutions_strippacking.csv", "a") as ssf:
-                        ssf.write("{},{},{},{}\n".format(i,j,k,numct3))
+                        numct3, layout = explore_cell(i, j, k)
+                    pruner.record(i, j, k, numct3)
+                    with timed_phase(INSTRUMENTATION, "file I/O"):
+                        if layout is not None:
+                            layouts.write_layout(i, j, k, *layout)
+                        sink.write_result(i, j, k, numct3)
+                    with timed_phase(INSTRUMENTATION, "nonproximity"):
+                        metrics.write(i, j, k, numct3, layout)
+                    if INSTRUMENTATION is not None:
+                        INSTRUMENTATION.end_cell(i, j, k, numct3, skipped=False)
+                print("Cells skipped:", pruner.cells_skipped)
     else:
         print("Please specify input/output file(s)!")
         sys.exit(1)
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.finish()
 
 
 if __name__ == "__main__":
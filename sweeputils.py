@@ -0,0 +1,101 @@
+'''
+Helpers shared by the search space exploration of heur4ct.py, stripcd.py and rectpacker.py.
+'''
+
+
+import sys
+import os
+from layoutstore import LayoutReader, layout_store_exists
+
+
+# Removes option (e.g. "--workers") and its value from the list of command line arguments
+# Returns value of option, or default if option has not been passed
+def pop_option(argv, name, default=None):
+    if name not in argv:
+        return default
+    index = argv.index(name)
+    if index == len(argv) - 1:
+        print("Please specify value for option {}!".format(name))
+        sys.exit(1)
+    value = argv[index+1]
+    del argv[index:index+2]
+    return value
+
+
+# Removes flag (e.g. "--prune-dominated") from the list of command line arguments
+# Returns whether flag has been passed
+def pop_flag(argv, name):
+    if name not in argv:
+        return False
+    argv.remove(name)
+    return True
+
+
+# Decides which cells (i,j,k) of the search space can be skipped without running a solver
+# Cells are skipped if they violate the chip area constraint (looked up in bounds, a BoundIndex of boundindex.py, unless None) or,
+# if prune_dominated is set, if a component-wise smaller cell has already failed. The latter is only exact for solvers
+# whose feasibility is monotone in the core counts. Cells have to be visited in lexicographical order.
+class SweepPruner:
+    def __init__(self, bounds, prune_dominated):
+        self.bounds = bounds
+        self.prune_dominated = prune_dominated
+        self.failed = set()
+        self.cells_skipped = 0
+
+    def is_dominated(self, i, j, k):
+        return (i-1, j, k) in self.failed or (i, j-1, k) in self.failed or (i, j, k-1) in self.failed
+
+    def skip(self, i, j, k):
+        if self.bounds is not None and not self.bounds.is_area_feasible(i, j, k) or self.prune_dominated and self.is_dominated(i, j, k):
+            self.cells_skipped += 1
+            return True
+        return False
+
+    # Records number of fill cores for a cell, -1 marks failed (or skipped) cells
+    def record(self, i, j, k, numct3):
+        if numct3 == -1:
+            self.failed.add((i, j, k))
+
+
+# Yields all cells (i,j,k) of the search space in the order in which they are explored
+def sweep_cells(maxct0, maxct1, maxct2):
+    for i in range(maxct0+1):
+        for j in range(maxct1+1):
+            for k in range(maxct2+1):
+                yield i, j, k
+
+
+# Reads results file of an interrupted sweep, which serves as checkpoint, and returns number of fill cores for each completed cell
+# Lines have to match the order of cells; from the first line that is incomplete, out of order, or whose layout is
+# missing from the layout store at path layout_store (if given), the results file is truncated, and the sweep is resumed
+def load_checkpoint(output_file, cells, layout_store=None, fillwith="LITTLE"):
+    completed = {}
+    if not os.path.isfile(output_file):
+        return completed
+    layouts = None
+    if layout_store is not None and layout_store_exists(layout_store):
+        layouts = LayoutReader(layout_store)
+    valid_size = 0
+    with open(output_file, "r") as chkf:
+        for line, cell in zip(chkf, cells):
+            fields = line.rstrip("\n").split(",")
+            if not line.endswith("\n") or len(fields) != 4:
+                break
+            try:
+                values = [int(field) for field in fields]
+            except ValueError:
+                break
+            if tuple(values[:3]) != tuple(cell):
+                break
+            numct3 = values[3]
+            if numct3 != -1 and layout_store is not None:
+                if layouts is None or cell not in layouts or layouts.count_cores(*cell, fillwith) != numct3:
+                    break
+            completed[tuple(cell)] = numct3
+            valid_size += len(line)
+    if os.path.getsize(output_file) > valid_size:
+        print("Discarding results after line {} of {}".format(len(completed), output_file))
+        with open(output_file, "r+") as chkf:
+            chkf.truncate(valid_size)
+    print("Resuming after {} completed cells".format(len(completed)))
+    return completed